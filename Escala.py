@@ -2,7 +2,17 @@ import os
 import time
 import streamlit as st
 import pandas as pd
-import calendar
+import analitico
+import autenticacao
+import calendario
+import cobertura
+import dados
+import exportacao
+import importacao
+import metricas
+import tarefas
+from indice_escala import IndiceEscala
+from notificacoes import caixa, NAO_LIDA
 from datetime import datetime, date
 
 # =========================
@@ -10,6 +20,10 @@ from datetime import datetime, date
 # =========================
 st.set_page_config(page_title="WFM Atlas", layout="wide")
 
+# Tempo por etapa deste rerun (só com ESCALA_METRICAS=1, ver metricas.py)
+medicao = metricas.iniciar()
+medicao.marcar("estilo")
+
 # =========================
 # ESTILO (CSS)
 # =========================
@@ -41,53 +55,68 @@ h1,h2,h3,h4,h5,h6,p,span,div,label { color: #FFFFFF !important; }
 """, unsafe_allow_html=True)
 
 # =========================
-# ARQUIVOS / PATHS
+# ARMAZENAMENTO
 # =========================
-BASE = os.getcwd()
-PATH_USUARIOS = os.path.join(BASE, "usuarios.csv")
-PATH_ESCALA = os.path.join(BASE, "Escala.csv")
-PATH_HORA_EXTRA = os.path.join(BASE, "HoraExtra.csv")
-PATH_TROCA_FOLGA = os.path.join(BASE, "TrocaFolga.csv")
-PATH_NOTIFICACOES = os.path.join(BASE, "Notificacoes.csv")
-
-def ensure_csv(path, cols):
-    if not os.path.exists(path):
-        pd.DataFrame(columns=cols).to_csv(path, index=False, encoding="utf-8-sig")
-
-def read_csv_safe(path):
-    try:
-        return pd.read_csv(path, encoding="utf-8-sig")
-    except:
-        return pd.DataFrame()
-
-# Garante que todos existam
-ensure_csv(PATH_USUARIOS, ["Usuario", "Senha", "Tipo"])
-ensure_csv(PATH_ESCALA, ["Nome", "Data", "Horário", "Pausa"])
-ensure_csv(PATH_HORA_EXTRA, ["Nome", "Dia", "Horas", "Motivo", "Status", "Aprovador"])
-ensure_csv(PATH_TROCA_FOLGA, ["Nome", "Tipo", "Data Origem", "Nova Data", "Motivo", "Status", "PessoaTroca", "Aprovador"])
-ensure_csv(PATH_NOTIFICACOES, ["Usuario", "Mensagem", "Status", "DataHora"])
-
-usuarios = read_csv_safe(PATH_USUARIOS)
-escala = read_csv_safe(PATH_ESCALA)
-hora_extra = read_csv_safe(PATH_HORA_EXTRA)
-trocas = read_csv_safe(PATH_TROCA_FOLGA)
-notificacoes = read_csv_safe(PATH_NOTIFICACOES)
+# Tabelas "usuarios", "escala", "hora_extra", "trocas" e "notificacoes".
+# Por padrão ficam nos CSVs da pasta atual; com ESCALA_BACKEND=sqlite vão
+# para um arquivo SQLite indexado (ver armazenamento.py).
+
+medicao.marcar("carregar tabelas")
+
+# Garante que todas existam
+dados.garantir_tabelas()
+
+# Tabelas vêm do cache do processo (dados.py): só são relidas quando mudam,
+# e cada sessão recebe uma visão somente-leitura.
+escala = dados.carregar("escala")
+hora_extra = dados.carregar("hora_extra")
+trocas = dados.carregar("trocas")
 
 # =========================
 # FUNÇÕES AUXILIARES
 # =========================
-def enviar_notificacao(usuario, msg):
-    global notificacoes
-    nova = {
+def nova_notificacao(usuario, msg):
+    return {
         "Usuario": usuario,
         "Mensagem": msg,
         "Status": "Nao Lida",
         "DataHora": pd.Timestamp.now()
     }
-    notificacoes = pd.concat([notificacoes, pd.DataFrame([nova])], ignore_index=True)
-    notificacoes.to_csv(PATH_NOTIFICACOES, index=False, encoding="utf-8-sig")
 
-def rerun(): st.rerun()
+def enviar_notificacao(usuario, msg):
+    # Gravada pela fila de tarefas, fora do clique
+    tarefas.enfileirar("notificar", registros=[nova_notificacao(usuario, msg)])
+
+def auditar(acao, tabela, ids, **extra):
+    tarefas.enfileirar("auditoria", quando=pd.Timestamp.now(), usuario=st.session_state.usuario,
+                       acao=acao, tabela=tabela, ids=[int(i) for i in ids], **extra)
+
+def decidir_em_lote(tabela, selecionadas, status, msg):
+    # Só o status das solicitações é gravado antes de responder; as
+    # notificações, a auditoria e os indicadores vão para a fila de tarefas
+    ids = list(selecionadas.index)
+    dados.atualizar(tabela, ids, {"Status": status, "Aprovador": st.session_state.usuario})
+    tarefas.enfileirar("notificar", registros=[nova_notificacao(nome, msg) for nome in selecionadas["Nome"]])
+    auditar(status, tabela, ids)
+    tarefas.enfileirar("agregados")
+
+def mostrar_avaliacao(av):
+    # Resultado da verificação de escala/cobertura (cobertura.py)
+    for c in av.conflitos:
+        st.error(c)
+    for a in av.avisos:
+        st.warning(a)
+    for dia, ini, fim, n in av.faltas:
+        st.warning(f"{dia:%d/%m/%Y} {ini}–{fim}: ficaria com {n} agente(s), abaixo do mínimo de {cobertura.MINIMO_AGENTES}")
+    if not (av.conflitos or av.avisos or av.faltas):
+        st.caption(f"Cobertura: {cobertura.resumir(av)}")
+
+def rerun():
+    medicao.concluir()
+    st.rerun()
+
+# st.fragment só existe a partir do Streamlit 1.37
+fragmento = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", lambda f: f)
 
 def logout():
     for k in list(st.session_state.keys()):
@@ -100,26 +129,30 @@ def logout():
 # =========================
 # LOGIN
 # =========================
+medicao.marcar("login")
 if "logado" not in st.session_state: st.session_state.logado = False
 if "usuario" not in st.session_state: st.session_state.usuario = ""
 if "tipo" not in st.session_state: st.session_state.tipo = ""
 
 if not st.session_state.logado:
+    medicao.pagina = "Login"
     st.title("🔐 WFM Atlas – Login")
     login = st.text_input("Usuário")
     senha = st.text_input("Senha", type="password")
     if st.button("Entrar"):
-        if usuarios.empty:
+        if not len(autenticacao.indice()):
             st.error("Nenhum usuário cadastrado no arquivo usuarios.csv")
         else:
-            mask = (usuarios["Usuario"].str.lower() == login.lower()) & (usuarios["Senha"].astype(str) == senha)
-            if not usuarios[mask].empty:
-                st.session_state.usuario = usuarios.loc[mask, "Usuario"].values[0]
-                st.session_state.tipo = usuarios.loc[mask, "Tipo"].values[0].lower()
+            # Consulta no índice de usuários + uma verificação de hash
+            resultado = autenticacao.autenticar(login, senha)
+            if resultado:
+                st.session_state.usuario, tipo = resultado
+                st.session_state.tipo = tipo.lower()
                 st.session_state.logado = True
                 rerun()
             else:
                 st.error("Usuário ou senha incorretos.")
+    medicao.concluir()
     st.stop()
 
 # =========================
@@ -135,15 +168,30 @@ with top_container:
 # =========================
 # SIDEBAR MENU
 # =========================
+medicao.marcar("menu e notificações")
 tipo_usuario = st.session_state.tipo.strip().lower()
 is_gestor = tipo_usuario in ["adm", "admin", "administrador", "gestor"]
+is_admin = tipo_usuario in ["adm", "admin", "administrador"]
 
 if is_gestor:
-    pagina = st.sidebar.radio("Menu", ["📋 Aprovar Hora Extra", "🔁 Aprovar Trocas", "🗂 Histórico"])
+    paginas = ["📋 Aprovar Hora Extra", "🔁 Aprovar Trocas", "📅 Escala da Equipe", "📥 Importar Escala", "📊 Indicadores", "🔔 Notificações", "🗂 Histórico"]
+    if is_admin:
+        paginas.append("⏱ Desempenho")
+    pagina = st.sidebar.radio("Menu", paginas)
 else:
-    pagina = st.sidebar.radio("Menu", ["📅 Escala", "🕓 Hora Extra", "🔁 Troca de Folga", "🗂 Histórico"])
+    pagina = st.sidebar.radio("Menu", ["📅 Escala", "🕓 Hora Extra", "🔁 Troca de Folga", "🔔 Notificações", "🗂 Histórico"])
+medicao.pagina = pagina
+
+# Avisos para gestores são enviados ao destinatário "adm"
+destinatarios = [st.session_state.usuario] + (["adm"] if is_gestor else [])
+nao_lidas = caixa.nao_lidas(destinatarios)
+if nao_lidas:
+    st.sidebar.markdown(f"🔔 **{nao_lidas}** notificação(ões) não lida(s)")
+caixa.retencao_em_segundo_plano()
+tarefas.iniciar()
 
 st.title(f"WFM Atlas – {pagina}")
+medicao.marcar("página")
 
 # =========================
 # CONTEÚDO (AGENTE)
@@ -153,106 +201,33 @@ if not is_gestor:
         if escala.empty:
             st.info("Nenhuma escala cadastrada.")
         else:
-            # Filtro por colaborador atual e tratamento de datas
-            df = escala.copy()
-            # Tentar parsear data no formato DD/MM/YYYY
-            try:
-                df["Data"] = pd.to_datetime(df["Data"], format="%d/%m/%Y", errors="coerce").dt.date
-            except:
-                # Fallback para formato padrão
-                df["Data"] = pd.to_datetime(df["Data"], errors="coerce").dt.date
-            df = df[df["Nome"].astype(str).str.lower() == st.session_state.usuario.lower()]
-
-            # Seletores de mês/ano
-            hoje = date.today()
-            col_m, col_y = st.columns([1,1])
-            with col_m:
-                mes = st.selectbox("Mês", list(range(1,13)), index=(hoje.month-1))
-            with col_y:
-                ano = st.selectbox("Ano", list(range(hoje.year-2, hoje.year+3)), index=2)
-
-            # Preparar mapa de entradas existentes
-            por_dia = {}
-            for _, r in df.iterrows():
-                d = r["Data"]
-                if pd.isna(d):
-                    continue
-                # Tentar diferentes nomes de coluna (pode ter encoding issues)
-                horario_col = r.get("Horário", r.get("HorÃ¡rio", ""))
-                pausa_col = r.get("Pausa", "")
-                por_dia[d] = {
-                    "horario": str(horario_col),
-                    "pausa": str(pausa_col)
-                }
-
-            # Função para parsear horário
-            def parse_horario(h):
-                h = (h or "").strip()
-                if "-" in h:
-                    partes = h.split("-", 1)
-                    return partes[0].strip(), partes[1].strip()
-                return "", ""
-
-            # Gerar calendário
-            cal = calendar.Calendar(firstweekday=0)  # Segunda-feira = 0
-            semanas = cal.monthdatescalendar(ano, mes)
-            
-            # Cabeçalho dos dias da semana
-            dias_semana = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
-            
-            html = '<div class="calendar-grid">'
-            
-            # Cabeçalho
-            for dia in dias_semana:
-                html += f'<div class="cal-day-header">{dia}</div>'
-            
-            # Dias do calendário
-            for semana in semanas:
-                for dia in semana:
-                    is_other_month = dia.month != mes
-                    other_month_class = " other-month" if is_other_month else ""
-                    
-                    # Buscar dados do dia
-                    entry = por_dia.get(dia, None)
-                    
-                    if entry:
-                        horario_raw = (entry.get("horario") or "").strip()
-                        pausa = (entry.get("pausa") or "").strip()
-                        
-                        # Detectar folga
-                        is_folga = "folga" in horario_raw.lower() or "off" in horario_raw.lower()
-                        folga_class = " folga" if is_folga else ""
-                        
-                        # Parsear horário
-                        hi, hf = parse_horario(horario_raw)
-                        
-                        # Se for folga, mostrar "FOLGA" em preto
-                        if is_folga:
-                            content = '<div class="cal-day-content"><div class="cal-time-line" style="color: #000000 !important; font-weight: bold !important;">FOLGA</div></div>'
-                        else:
-                            # Mostrar horários (sempre mostrar os 3 campos, sem rótulos)
-                            hi_display = hi if hi else "—"
-                            hf_display = hf if hf else "—"
-                            pausa_display = pausa if pausa and pausa != "-" else "—"
-                            
-                            content = f'''<div class="cal-day-content">
-                                <div class="cal-time-line">{hi_display}</div>
-                                <div class="cal-time-line">{hf_display}</div>
-                                <div class="cal-time-line">{pausa_display}</div>
-                            </div>'''
-                    else:
-                        # Dia sem registro
-                        folga_class = ""
-                        content = '<div class="cal-day-content"><div class="cal-time-line">—</div></div>'
-                    
-                    html += f'''<div class="cal-day-cell{other_month_class}{folga_class}">
-                        <div class="cal-day-number">{dia.day}</div>
-                        {content}
-                    </div>'''
-            
-            html += '</div>'
-            
-            st.markdown(html, unsafe_allow_html=True)
+            # O calendário é um fragmento: trocar mês/ano só reexecuta este
+            # trecho, e o HTML vem do cache por (agente, ano, mês, versão)
+            @fragmento
+            @metricas.medir_fragmento("📅 Escala · calendário")
+            def calendario_agente():
+                # Seletores de mês/ano
+                hoje = date.today()
+                col_m, col_y = st.columns([1,1])
+                with col_m:
+                    mes = st.selectbox("Mês", list(range(1,13)), index=(hoje.month-1))
+                with col_y:
+                    ano = st.selectbox("Ano", list(range(hoje.year-2, hoje.year+3)), index=2)
+
+                with metricas.etapa("índice da escala"):
+                    indice = dados.derivado("escala", "indice", IndiceEscala)
+                with metricas.etapa("calendário HTML"):
+                    html = calendario.calendario_agente(indice, st.session_state.usuario, ano, mes)
+                st.markdown(html, unsafe_allow_html=True)
+
+                # O .ics só é gerado no clique (fora do rerun) e fica em cache
+                # pela versão da escala do agente
+                usuario = st.session_state.usuario
+                st.download_button("📆 Baixar para o calendário (.ics)",
+                                   lambda: exportacao.ical_agente(usuario, ano, mes, indice),
+                                   file_name=f"escala_{ano}-{mes:02d}.ics", mime="text/calendar")
+
+            calendario_agente()
 
     elif pagina == "🕓 Hora Extra":
         st.subheader("Solicitar Hora Extra")
@@ -276,28 +251,37 @@ if not is_gestor:
         dur_label = st.selectbox("Duração", labels, index=labels.index(label_default))
         dur_min = label_to_minutes[dur_label]
 
+        # A hora extra estende o turno do dia; a verificação usa a contagem
+        # de cobertura já montada para a versão atual da escala
+        avaliacao = None
+        if not escala.empty:
+            with metricas.etapa("cobertura"):
+                avaliacao = cobertura.avaliar_hora_extra(st.session_state.usuario, dia, dur_min)
+            mostrar_avaliacao(avaliacao)
+
         motivo = st.text_area("Motivo")
         if st.button("Enviar Solicitação"):
             # Validação de segurança (máximo 2 horas)
             if dur_min > 120:
                 st.error("A duração máxima permitida é de 2 horas.")
+            elif avaliacao and avaliacao.conflitos:
+                st.error("Corrija os conflitos com a escala antes de enviar.")
             else:
                 horas_str = f"{dur_min//60:02d}:{dur_min%60:02d}"
-                nova = pd.DataFrame([{
+                nova = {
                     "Nome": st.session_state.usuario,
                     "Dia": dia,
                     "Horas": horas_str,
                     "Motivo": motivo,
                     "Status": "Pendente",
                     "Aprovador": ""
-                }])
-                hora_extra = pd.concat([hora_extra, nova], ignore_index=True)
-                hora_extra.to_csv(PATH_HORA_EXTRA, index=False, encoding="utf-8-sig")
+                }
+                dados.anexar("hora_extra", [nova])
                 enviar_notificacao("adm", f"Nova solicitação de hora extra de {st.session_state.usuario}")
                 st.success("Solicitação enviada!")
 
         st.subheader("Minhas Solicitações")
-        minhas = hora_extra[hora_extra["Nome"] == st.session_state.usuario]
+        minhas = dados.consultar("hora_extra", Nome=st.session_state.usuario)
         st.dataframe(minhas if not minhas.empty else pd.DataFrame([{"Status": "Nenhuma solicitação"}]))
 
     elif pagina == "🔁 Troca de Folga":
@@ -309,49 +293,21 @@ if not is_gestor:
         data_origem = st.date_input("Data Original")
         nova_data = st.date_input("Nova Data")
         
-        # Função para buscar agentes disponíveis na data selecionada
+        # Agentes trabalhando na data selecionada, a partir do índice por data
         def obter_agentes_disponiveis(data_selecionada):
             if escala.empty or pd.isna(data_selecionada):
                 return []
-            
-            df_escala = escala.copy()
-            # Tentar parsear data no formato DD/MM/YYYY
-            try:
-                df_escala["Data"] = pd.to_datetime(df_escala["Data"], format="%d/%m/%Y", errors="coerce").dt.date
-            except:
-                df_escala["Data"] = pd.to_datetime(df_escala["Data"], errors="coerce").dt.date
-            
-            # Filtrar pela data selecionada
-            df_data = df_escala[df_escala["Data"] == data_selecionada]
-            
-            agentes_disponiveis = []
-            for _, row in df_data.iterrows():
-                nome = str(row.get("Nome", "")).strip()
-                if not nome or nome.lower() == st.session_state.usuario.lower():
-                    continue  # Pular o próprio usuário
-                
-                # Tentar diferentes nomes de coluna (pode ter encoding issues)
-                horario_col = row.get("Horário", row.get("HorÃ¡rio", ""))
-                horario_str = str(horario_col).strip()
-                
-                # Verificar se não é folga
-                is_folga = "folga" in horario_str.lower() or "off" in horario_str.lower()
-                if is_folga:
-                    continue  # Pular folgas
-                
-                # Formatar horário para exibição
-                if horario_str and horario_str != "nan":
-                    agentes_disponiveis.append({
-                        "nome": nome,
-                        "horario": horario_str
-                    })
-            
-            return agentes_disponiveis
+            indice = dados.derivado("escala", "indice", IndiceEscala)
+            return [
+                {"nome": nome, "horario": turno.horario}
+                for nome, turno in indice.trabalhando(data_selecionada, excluir=st.session_state.usuario)
+            ]
         
         # Campo de pessoa para troca - mostra agentes disponíveis quando data é selecionada
         pessoa = None
         if nova_data:
-            agentes = obter_agentes_disponiveis(nova_data)
+            with metricas.etapa("agentes disponíveis"):
+                agentes = obter_agentes_disponiveis(nova_data)
             if agentes:
                 # Criar lista de opções com nome e horário
                 opcoes_agentes = [f"{ag['nome']} - {ag['horario']}" for ag in agentes]
@@ -369,12 +325,21 @@ if not is_gestor:
             pessoa_input = st.text_input("Pessoa para troca")
             pessoa = pessoa_input.strip() if pessoa_input else None
         
+        # Confere a escala dos dois e a cobertura dos dias afetados
+        avaliacao = None
+        if pessoa and not escala.empty:
+            with metricas.etapa("cobertura"):
+                avaliacao = cobertura.avaliar_troca(st.session_state.usuario, tipo, data_origem, nova_data, pessoa)
+            mostrar_avaliacao(avaliacao)
+
         motivo = st.text_area("Motivo")
         if st.button("Enviar Troca"):
             if not pessoa:
                 st.error("Por favor, selecione ou digite uma pessoa para troca.")
+            elif avaliacao and avaliacao.conflitos:
+                st.error("Corrija os conflitos com a escala antes de enviar.")
             else:
-                nova = pd.DataFrame([{
+                nova = {
                     "Nome": st.session_state.usuario,
                     "Tipo": tipo,
                     "Data Origem": data_origem,
@@ -383,20 +348,19 @@ if not is_gestor:
                     "Status": "Pendente",
                     "PessoaTroca": pessoa,
                     "Aprovador": ""
-                }])
-                trocas = pd.concat([trocas, nova], ignore_index=True)
-                trocas.to_csv(PATH_TROCA_FOLGA, index=False, encoding="utf-8-sig")
+                }
+                dados.anexar("trocas", [nova])
                 enviar_notificacao("adm", f"{st.session_state.usuario} solicitou {tipo.lower()}")
                 st.success("Solicitação enviada!")
 
         st.subheader("Minhas Solicitações")
-        minhas = trocas[trocas["Nome"] == st.session_state.usuario]
+        minhas = dados.consultar("trocas", Nome=st.session_state.usuario)
         st.dataframe(minhas if not minhas.empty else pd.DataFrame([{"Status": "Nenhuma troca enviada"}]))
 
     elif pagina == "🗂 Histórico":
         st.subheader("Histórico de Solicitações")
-        df1 = hora_extra[hora_extra["Nome"] == st.session_state.usuario]
-        df2 = trocas[trocas["Nome"] == st.session_state.usuario]
+        df1 = dados.consultar("hora_extra", Nome=st.session_state.usuario)
+        df2 = dados.consultar("trocas", Nome=st.session_state.usuario)
         if df1.empty and df2.empty:
             st.info("Nenhum histórico encontrado.")
         else:
@@ -409,52 +373,316 @@ if not is_gestor:
 # CONTEÚDO (GESTOR)
 # =========================
 else:
+    # Painel de aprovação em lote: filtros, lista paginada com seleção e
+    # um único lote de escrita para aprovar/reprovar todas as selecionadas
+    def painel_aprovacao(tabela, pendentes, col_data, col_tipo, msg_aprovada, msg_reprovada):
+        aviso = st.session_state.pop(f"aviso_{tabela}", None)
+        if aviso:
+            st.success(aviso)
+        if pendentes.empty:
+            st.info("Nenhuma solicitação pendente.")
+            return
+
+        # Datas gravadas pelo app (AAAA-MM-DD) ou importadas (DD/MM/AAAA)
+        texto = pendentes[col_data].astype(str)
+        datas = pd.to_datetime(texto, format="%Y-%m-%d", errors="coerce").fillna(
+            pd.to_datetime(texto, format="%d/%m/%Y", errors="coerce")).dt.date
+        c1, c2, c3 = st.columns([2,2,2])
+        with c1:
+            agentes = st.multiselect("Agentes", sorted(pendentes["Nome"].dropna().astype(str).unique()), key=f"filtro_agentes_{tabela}")
+        with c2:
+            validas = datas.dropna()
+            todo_periodo = (validas.min(), validas.max()) if not validas.empty else ()
+            periodo = st.date_input(
+                "Período", value=todo_periodo,
+                key=f"filtro_periodo_{tabela}",
+            )
+        with c3:
+            tipos = []
+            if col_tipo:
+                tipos = st.multiselect("Tipo", sorted(pendentes[col_tipo].dropna().astype(str).unique()), key=f"filtro_tipos_{tabela}")
+
+        mascara = pd.Series(True, index=pendentes.index)
+        if agentes:
+            mascara &= pendentes["Nome"].astype(str).isin(agentes)
+        # Só filtra se o período foi mudado: o padrão (todas as datas) não
+        # pode esconder as linhas sem data válida
+        if isinstance(periodo, (list, tuple)) and len(periodo) == 2 and tuple(periodo) != todo_periodo:
+            mascara &= (datas >= periodo[0]) & (datas <= periodo[1])
+        if tipos:
+            mascara &= pendentes[col_tipo].astype(str).isin(tipos)
+        filtradas = pendentes[mascara]
+        if filtradas.empty:
+            st.info("Nenhuma solicitação pendente com esses filtros.")
+            return
+
+        c1, c2 = st.columns([1,3])
+        with c1:
+            por_pagina = st.selectbox("Por página", [25, 50, 100], key=f"por_pagina_{tabela}")
+        total_paginas = -(-len(filtradas) // por_pagina)
+        with c2:
+            pag = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, key=f"pagina_{tabela}")
+        trecho = filtradas.iloc[(pag-1)*por_pagina : pag*por_pagina]
+
+        todas = st.checkbox(f"Selecionar todas as {len(filtradas)} filtradas", key=f"todas_{tabela}")
+        editor = trecho.copy()
+        editor.insert(0, "Selecionar", todas)
+        if not escala.empty:
+            with metricas.etapa("cobertura da página"):
+                _, resumo = cobertura.avaliar_lote(tabela, trecho)
+            editor.insert(1, "Cobertura", pd.Series(resumo))
+        # A chave muda com a versão da tabela: após gravar, a seleção zera
+        editado = st.data_editor(
+            editor, disabled=[c for c in editor.columns if c != "Selecionar"], hide_index=True,
+            key=f"editor_{tabela}_{pag}_{hash(dados.versao(tabela))}",
+        )
+        selecionadas = filtradas if todas else trecho[editado["Selecionar"].to_numpy()]
+        st.caption(f"{len(filtradas)} pendentes · página {pag} de {total_paginas} · {len(selecionadas)} selecionadas")
+
+        # As selecionadas são avaliadas juntas: duas trocas podem passar
+        # sozinhas e descobrir o mesmo intervalo quando aprovadas no mesmo lote
+        confirmado = True
+        if not selecionadas.empty and not escala.empty:
+            with metricas.etapa("cobertura das selecionadas"):
+                lote, _ = cobertura.avaliar_lote(tabela, selecionadas)
+            if lote.conflitos or lote.avisos or lote.faltas:
+                with st.expander("Problemas de escala/cobertura nas selecionadas", expanded=True):
+                    mostrar_avaliacao(lote)
+                confirmado = st.checkbox("Aprovar mesmo assim", key=f"confirmar_{tabela}")
+
+        b1, b2 = st.columns(2)
+        decisao = None
+        if b1.button("Aprovar selecionadas", key=f"aprovar_{tabela}", disabled=selecionadas.empty or not confirmado):
+            decisao = ("Aprovado", msg_aprovada, "aprovadas")
+        if b2.button("Reprovar selecionadas", key=f"reprovar_{tabela}", disabled=selecionadas.empty):
+            decisao = ("Reprovado", msg_reprovada, "reprovadas")
+        if decisao:
+            status, msg, rotulo = decisao
+            with metricas.etapa("gravar decisão"):
+                decidir_em_lote(tabela, selecionadas, status, msg)
+            st.session_state[f"aviso_{tabela}"] = f"{len(selecionadas)} solicitações {rotulo}."
+            # Não deixa "selecionar todas" marcado para o próximo lote
+            st.session_state.pop(f"todas_{tabela}", None)
+            st.session_state.pop(f"confirmar_{tabela}", None)
+            rerun()
+
     if pagina == "📋 Aprovar Hora Extra":
         st.header("Aprovação de Horas Extras")
-        pend_extras = hora_extra[hora_extra["Status"].str.lower() == "pendente"]
-        if pend_extras.empty:
-            st.info("Nenhuma solicitação pendente.")
-        for idx, row in pend_extras.iterrows():
-            with st.expander(f"{row['Nome']} - {row['Dia']} ({row['Horas']}h)"):
-                st.write(row["Motivo"])
-                c1, c2 = st.columns(2)
-                if c1.button("Aprovar", key=f"ap_extra_{idx}"):
-                    hora_extra.loc[idx, ["Status","Aprovador"]] = ["Aprovado", st.session_state.usuario]
-                    enviar_notificacao(row["Nome"], "Sua hora extra foi aprovada.")
-                    hora_extra.to_csv(PATH_HORA_EXTRA, index=False, encoding="utf-8-sig")
-                    st.success("Aprovado!")
-                    rerun()
-                if c2.button("Reprovar", key=f"rep_extra_{idx}"):
-                    hora_extra.loc[idx, ["Status","Aprovador"]] = ["Reprovado", st.session_state.usuario]
-                    enviar_notificacao(row["Nome"], "Sua hora extra foi reprovada.")
-                    hora_extra.to_csv(PATH_HORA_EXTRA, index=False, encoding="utf-8-sig")
-                    st.error("Reprovado!")
-                    rerun()
+        with metricas.etapa("pendentes"):
+            pend_extras = dados.consultar("hora_extra", Status="pendente")
+        painel_aprovacao("hora_extra", pend_extras, "Dia", None,
+                         "Sua hora extra foi aprovada.", "Sua hora extra foi reprovada.")
 
     elif pagina == "🔁 Aprovar Trocas":
         st.header("Aprovação de Trocas de Folga / Horário")
-        pend_trocas = trocas[trocas["Status"].str.lower() == "pendente"]
-        if pend_trocas.empty:
-            st.info("Nenhuma troca pendente.")
-        for idx, row in pend_trocas.iterrows():
-            with st.expander(f"{row['Nome']} - {row['Tipo']} ({row['Data Origem']} → {row['Nova Data']})"):
-                st.write(row["Motivo"])
-                c1, c2 = st.columns(2)
-                if c1.button("Aprovar", key=f"ap_troca_{idx}"):
-                    trocas.loc[idx, ["Status","Aprovador"]] = ["Aprovado", st.session_state.usuario]
-                    enviar_notificacao(row["Nome"], "Sua troca foi aprovada.")
-                    trocas.to_csv(PATH_TROCA_FOLGA, index=False, encoding="utf-8-sig")
-                    st.success("Aprovado!")
-                    rerun()
-                if c2.button("Reprovar", key=f"rep_troca_{idx}"):
-                    trocas.loc[idx, ["Status","Aprovador"]] = ["Reprovado", st.session_state.usuario]
-                    enviar_notificacao(row["Nome"], "Sua troca foi reprovada.")
-                    trocas.to_csv(PATH_TROCA_FOLGA, index=False, encoding="utf-8-sig")
-                    st.error("Reprovado!")
-                    rerun()
+        with metricas.etapa("pendentes"):
+            pend_trocas = dados.consultar("trocas", Status="pendente")
+        painel_aprovacao("trocas", pend_trocas, "Data Origem", "Tipo",
+                         "Sua troca foi aprovada.", "Sua troca foi reprovada.")
+
+    elif pagina == "📅 Escala da Equipe":
+        if escala.empty:
+            st.info("Nenhuma escala cadastrada.")
+        else:
+            # Grade agentes x dias do mês, montada com um pivot por versão da
+            # escala e paginada para não mandar centenas de linhas de uma vez
+            @fragmento
+            @metricas.medir_fragmento("📅 Escala da Equipe · grade")
+            def grade_equipe():
+                hoje = date.today()
+                col_m, col_y, col_b = st.columns([1,1,2])
+                with col_m:
+                    mes = st.selectbox("Mês", list(range(1,13)), index=(hoje.month-1), key="grade_mes")
+                with col_y:
+                    ano = st.selectbox("Ano", list(range(hoje.year-2, hoje.year+3)), index=2, key="grade_ano")
+                with col_b:
+                    busca = st.text_input("Buscar agente", key="grade_busca")
+
+                with metricas.etapa("grade do mês"):
+                    indice = dados.derivado("escala", "indice", IndiceEscala)
+                    grade = dados.derivado("escala", ("grade", ano, mes), lambda _: indice.grade_mes(ano, mes))
+                if busca:
+                    grade = grade[grade.index.str.contains(busca.strip(), case=False, regex=False)]
+                if grade.empty:
+                    st.info("Nenhum agente com escala neste mês.")
+                    return
+
+                por_pagina = 50
+                total_paginas = -(-len(grade) // por_pagina)
+                pag = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, key="grade_pagina")
+                trecho = grade.iloc[(pag-1)*por_pagina : pag*por_pagina]
+
+                def destacar_folga(v):
+                    return "background-color: #e6e6e6; color: #000000; font-weight: bold" if v == "FOLGA" else ""
+
+                st.dataframe(trecho.style.map(destacar_folga))
+                st.caption(f"{len(grade)} agentes · página {pag} de {total_paginas}")
+
+                # Exportação do mês inteiro (sem o filtro da busca), gerada no
+                # clique e guardada em disco pela versão da escala
+                colunas = st.columns(len(exportacao.FORMATOS))
+                for col, formato in zip(colunas, exportacao.FORMATOS):
+                    with col:
+                        if formato in exportacao.formatos_equipe():
+                            st.download_button(f"Baixar {formato.upper()}",
+                                               lambda f=formato: exportacao.conteudo_equipe(ano, mes, f),
+                                               file_name=f"escala_equipe_{ano}-{mes:02d}.{formato}",
+                                               mime=exportacao.mime(formato), key=f"exportar_{formato}")
+                        else:
+                            st.caption(f"{formato.upper()} indisponível (instale o openpyxl).")
+
+            grade_equipe()
+
+    elif pagina == "📥 Importar Escala":
+        st.header("Importar Escala")
+        st.caption("CSV com as colunas Nome, Data (DD/MM/AAAA), Horário (HH:MM - HH:MM ou FOLGA) e Pausa (HH:MM ou -). "
+                   "Só as linhas novas ou alteradas em relação à escala atual são gravadas.")
+        arquivo = st.file_uploader("Arquivo da escala", type=["csv"])
+        if arquivo is not None and st.button("Validar arquivo"):
+            # Índice pronto antes de gravar, para ser atualizado por delta
+            dados.derivado("escala", "indice", IndiceEscala)
+            st.session_state.importacao = importacao.analisar(arquivo)
+
+        resultado = st.session_state.get("importacao")
+        if resultado is not None:
+            c = st.columns(5)
+            c[0].metric("Lidas", resultado.total)
+            c[1].metric("Rejeitadas", len(resultado.rejeitadas))
+            c[2].metric("Novas", len(resultado.novas))
+            c[3].metric("Alteradas", len(resultado.alteradas))
+            c[4].metric("Inalteradas", resultado.inalteradas)
+
+            if resultado.rejeitadas:
+                st.warning("Linhas rejeitadas não serão importadas:")
+                rejeitadas = resultado.tabela_rejeitadas()
+                st.dataframe(rejeitadas.head(500), hide_index=True)
+                st.download_button("Baixar linhas rejeitadas", rejeitadas.to_csv(index=False).encode("utf-8-sig"),
+                                   file_name="rejeitadas.csv", mime="text/csv")
+
+            if st.button("Aplicar alterações", disabled=not resultado.pendentes):
+                st.session_state.pop("importacao", None)
+                try:
+                    gravadas = importacao.aplicar(resultado)
+                    st.success(f"{gravadas} linhas gravadas na escala.")
+                except importacao.EscalaAlterada:
+                    st.error("A escala foi alterada depois da validação. Valide o arquivo de novo.")
+
+    elif pagina == "📊 Indicadores":
+        # Tudo aqui lê dos agregados do processo (analitico.py), atualizados
+        # por diferença quando hora_extra/trocas mudam
+        ag = analitico.agregados.atualizar()
+        taxa_he = ag.taxa_aprovacao(ag.status_hora_extra)
+        taxa_tr = ag.taxa_aprovacao(ag.status_trocas)
+        c = st.columns(4)
+        c[0].metric("Horas extras pendentes", ag.status_hora_extra[analitico.PENDENTE])
+        c[1].metric("Aprovação de horas extras", f"{taxa_he:.0%}" if taxa_he is not None else "—")
+        c[2].metric("Trocas pendentes", ag.status_trocas[analitico.PENDENTE])
+        c[3].metric("Aprovação de trocas", f"{taxa_tr:.0%}" if taxa_tr is not None else "—")
+
+        st.subheader("Horas extras aprovadas")
+        por_mes = ag.minutos_por_mes()
+        if por_mes.empty:
+            st.info("Nenhuma hora extra aprovada.")
+        else:
+            horas_mes = por_mes.pivot_table(index="Mês", columns="Agente", values="Minutos", aggfunc="sum").fillna(0) / 60
+            st.bar_chart(horas_mes)
+            mes_sel = st.selectbox("Mês", sorted(por_mes["Mês"].unique(), reverse=True), key="ind_mes")
+            por_semana = ag.minutos_por_semana()
+            por_semana = por_semana[por_semana["Mês"] == mes_sel]
+            semanas = por_semana.pivot_table(index="Agente", columns="Semana", values="Minutos", aggfunc="sum").fillna(0) / 60
+            # A semana que começou no mês anterior aparece a partir do dia 1
+            inicio_mes = pd.Timestamp(f"{mes_sel}-01")
+            semanas.columns = [f"Semana de {max(pd.Timestamp(c), inicio_mes):%d/%m}" for c in semanas.columns]
+            semanas["Total no mês"] = por_mes[por_mes["Mês"] == mes_sel].set_index("Agente")["Minutos"] / 60
+            st.caption("Horas por agente e semana")
+            st.dataframe(semanas.round(2))
+
+        st.subheader("Trocas aprovadas por mês")
+        trocas_mes = ag.trocas_por_mes()
+        if trocas_mes.empty:
+            st.info("Nenhuma troca aprovada.")
+        else:
+            st.bar_chart(trocas_mes.pivot_table(index="Mês", columns="Agente", values="Trocas", aggfunc="sum").fillna(0))
+
+        st.subheader("Folgas por dia")
+        folgas_dia = analitico.cobertura_folgas()
+        if folgas_dia.empty:
+            st.info("Nenhuma escala cadastrada.")
+        else:
+            meses = sorted({d.strftime("%Y-%m") for d in folgas_dia.index}, reverse=True)
+            mes_cob = st.selectbox("Mês da escala", meses, key="ind_mes_escala")
+            st.bar_chart(folgas_dia[folgas_dia.index.strftime("%Y-%m") == mes_cob])
+
+    elif pagina == "⏱ Desempenho":
+        # Só para administradores: tempos por página/etapa dos reruns
+        ligado = st.checkbox("Coletar métricas neste processo", value=metricas.ativo(),
+                             help="Também pode ser ligado com ESCALA_METRICAS=1")
+        if ligado != metricas.ativo():
+            metricas.ativar(ligado)
+        fonte = st.radio("Fonte", ["Este processo", "Log (todos os processos)"], horizontal=True)
+        regs = metricas.registros() if fonte == "Este processo" else metricas.ler_log()
+        st.caption(f"{len(regs)} reruns registrados · log em {metricas.caminho_log()}")
+        if not regs:
+            st.info("Nenhuma métrica registrada. Ligue a coleta e navegue pelas páginas.")
+        else:
+            tabela = metricas.resumo(regs)
+            totais = tabela[tabela["Etapa"] == "total"].set_index("Página")
+            st.bar_chart(totais[["p50 ms", "p95 ms"]])
+            pagina_sel = st.selectbox("Página", ["Todas"] + list(totais.index))
+            if pagina_sel != "Todas":
+                tabela = tabela[tabela["Página"] == pagina_sel]
+            st.dataframe(tabela, hide_index=True)
+            st.caption("Etapas com › são trechos medidos dentro da etapa anterior. "
+                       "Blocos = variação de blocos de memória alocados no processo.")
+
+        st.subheader("Fila de tarefas")
+        situacao = tarefas.situacao()
+        c = st.columns(4)
+        for col, (estado, n) in zip(c, situacao.items()):
+            col.metric(estado.capitalize(), n)
+        if situacao[tarefas.FALHOU]:
+            st.dataframe(tarefas.falhas(), hide_index=True)
+            if st.button("Tentar de novo as que falharam"):
+                tarefas.reenfileirar_falhas()
+                rerun()
 
     elif pagina == "🗂 Histórico":
         st.subheader("Histórico de Solicitações")
         st.dataframe(hora_extra)
         st.dataframe(trocas)
 
+# =========================
+# NOTIFICAÇÕES (TODOS)
+# =========================
+if pagina == "🔔 Notificações":
+    aviso = st.session_state.pop("aviso_notificacoes", None)
+    if aviso:
+        st.warning(aviso)
+    periodos = {"Últimos 7 dias": 7, "Últimos 30 dias": 30, "Todas": None}
+    periodo = st.selectbox("Mostrar", list(periodos), index=1)
+    dias = periodos[periodo]
+    desde = pd.Timestamp.now() - pd.Timedelta(days=dias) if dias else None
+
+    geracao = dados.geracao("notificacoes")
+    msgs = caixa.buscar(destinatarios, desde=desde)
+    if msgs.empty:
+        st.info("Nenhuma notificação.")
+    else:
+        editor = msgs[["DataHora", "Mensagem", "Status"]].copy()
+        editor.insert(0, "Selecionar", False)
+        editado = st.data_editor(
+            editor, disabled=["DataHora", "Mensagem", "Status"], hide_index=True,
+            key=f"notif_{hash(dados.versao('notificacoes'))}",
+        )
+        c1, c2 = st.columns(2)
+        marcar = None
+        if c1.button("Marcar selecionadas como lidas"):
+            marcar = msgs.index[editado["Selecionar"].to_numpy()]
+        if c2.button("Marcar todas como lidas", disabled=not nao_lidas):
+            marcar = msgs.index[msgs["Status"] == NAO_LIDA]
+        if marcar is not None:
+            if not caixa.marcar_lidas(marcar, geracao):
+                st.session_state["aviso_notificacoes"] = "As notificações foram reorganizadas; selecione de novo."
+            rerun()
+
+medicao.concluir()
@@ -0,0 +1,194 @@
+import threading
+from collections import Counter
+from datetime import date
+import numpy as np
+import pandas as pd
+import dados
+from indice_escala import IndiceEscala
+
+# =========================
+# INDICADORES (HORA EXTRA / TROCAS / FOLGAS)
+# =========================
+# Os totais ficam em contadores do processo e são atualizados por
+# diferença: quando hora_extra ou trocas mudam, só as linhas novas e as que
+# mudaram de status são somadas/subtraídas. Os gráficos leem desses
+# contadores, sem reagrupar o histórico inteiro a cada rerun.
+
+APROVADO = "Aprovado"
+REPROVADO = "Reprovado"
+PENDENTE = "Pendente"
+
+
+def normalizar_status(serie):
+    # Registros antigos usam "Aprovar"/"Reprovar"
+    s = serie.fillna("").astype(str).str.strip().str.lower()
+    return np.where(s.str.startswith("aprova"), APROVADO,
+                    np.where(s.str.startswith("reprova"), REPROVADO, PENDENTE))
+
+
+def _hhmm(serie):
+    partes = serie.fillna("").astype(str).str.strip().str.extract(r"^(\d{1,2}):(\d{2})$").astype(float)
+    return partes[0] * 60 + partes[1]
+
+
+def minutos_hora_extra(df):
+    # "Horas" em HH:MM; nos registros antigos, a diferença entre Início e Fim
+    horas = _hhmm(df["Horas"]) if "Horas" in df.columns else pd.Series(np.nan, index=df.index)
+    if "Início" in df.columns and "Fim" in df.columns:
+        diff = _hhmm(df["Fim"]) - _hhmm(df["Início"])
+        horas = horas.fillna(diff.where(diff >= 0, diff + 24 * 60))
+    return horas.fillna(0).astype(int)
+
+
+def _periodos(datas):
+    d = pd.to_datetime(datas, errors="coerce")
+    semana = (d - pd.to_timedelta(d.dt.weekday, unit="D")).dt.date
+    return semana, d.dt.strftime("%Y-%m")
+
+
+class _Estado:
+    def __init__(self):
+        self.versao = None
+        self.primeiro = None
+        self.linhas = pd.DataFrame()
+
+
+class Agregados:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._estados = {}
+        self._zerar_hora_extra()
+        self._zerar_trocas()
+
+    def _zerar_hora_extra(self):
+        self._estados["hora_extra"] = _Estado()
+        self.status_hora_extra = Counter()
+        self.minutos_semana = Counter()   # (agente, segunda-feira, "AAAA-MM") -> minutos aprovados
+        self.minutos_mes = Counter()      # (agente, "AAAA-MM") -> minutos aprovados
+
+    def _zerar_trocas(self):
+        self._estados["trocas"] = _Estado()
+        self.status_trocas = Counter()
+        self.trocas_mes = Counter()       # (agente, "AAAA-MM") -> trocas aprovadas
+
+    # ---- hora extra ----
+    def _linhas_hora_extra(self, df):
+        semana, mes = _periodos(df["Dia"] if "Dia" in df.columns else pd.Series(index=df.index, dtype=object))
+        return pd.DataFrame({
+            "agente": df["Nome"].fillna("").astype(str).str.strip(),
+            "semana": semana,
+            "mes": mes,
+            "minutos": minutos_hora_extra(df),
+            "status": normalizar_status(df["Status"]),
+        }, index=df.index)
+
+    def _somar_hora_extra(self, linhas, sinal):
+        for status, n in linhas["status"].value_counts().items():
+            self.status_hora_extra[status] += sinal * int(n)
+        aprovadas = linhas[linhas["status"] == APROVADO]
+        # A semana fica separada por mês: a que cruza a virada conta em cada
+        # mês só os dias dele
+        for chave, m in aprovadas.groupby(["agente", "semana", "mes"])["minutos"].sum().items():
+            self.minutos_semana[chave] += sinal * int(m)
+        for chave, m in aprovadas.groupby(["agente", "mes"])["minutos"].sum().items():
+            self.minutos_mes[chave] += sinal * int(m)
+
+    # ---- trocas ----
+    def _linhas_trocas(self, df):
+        _, mes = _periodos(df["Data Origem"] if "Data Origem" in df.columns else pd.Series(index=df.index, dtype=object))
+        return pd.DataFrame({
+            "agente": df["Nome"].fillna("").astype(str).str.strip(),
+            "mes": mes,
+            "status": normalizar_status(df["Status"]),
+        }, index=df.index)
+
+    def _somar_trocas(self, linhas, sinal):
+        for status, n in linhas["status"].value_counts().items():
+            self.status_trocas[status] += sinal * int(n)
+        aprovadas = linhas[linhas["status"] == APROVADO]
+        for chave, n in aprovadas.groupby(["agente", "mes"]).size().items():
+            self.trocas_mes[chave] += sinal * int(n)
+
+    def _sincronizar(self, tabela, zerar, preparar, somar):
+        versao = dados.versao(tabela)
+        estado = self._estados[tabela]
+        if versao == estado.versao:
+            return
+        df = dados.carregar(tabela)
+        if "Nome" not in df.columns or "Status" not in df.columns:
+            zerar()
+            self._estados[tabela].versao = versao
+            return
+        k = len(estado.linhas)
+        primeiro = df.index[0] if len(df) else None
+        # Linhas removidas ou reordenadas: recomeça do zero
+        if len(df) < k or (k and primeiro != estado.primeiro):
+            zerar()
+            estado = self._estados[tabela]
+            k = 0
+
+        # Linhas já somadas que mudaram de status: tira a contribuição antiga
+        # e soma a nova
+        if k:
+            status = normalizar_status(df["Status"].iloc[:k])
+            mudou = np.nonzero(status != estado.linhas["status"].to_numpy())[0]
+            if len(mudou):
+                antigas = estado.linhas.iloc[mudou]
+                somar(antigas, -1)
+                estado.linhas.loc[antigas.index, "status"] = status[mudou]
+                somar(estado.linhas.loc[antigas.index], +1)
+
+        # Linhas novas
+        if len(df) > k:
+            novas = preparar(df.iloc[k:])
+            somar(novas, +1)
+            estado.linhas = pd.concat([estado.linhas, novas]) if k else novas
+
+        estado.versao = versao
+        estado.primeiro = primeiro
+
+    def atualizar(self):
+        with self._trava:
+            self._sincronizar("hora_extra", self._zerar_hora_extra, self._linhas_hora_extra, self._somar_hora_extra)
+            self._sincronizar("trocas", self._zerar_trocas, self._linhas_trocas, self._somar_trocas)
+        return self
+
+    # ---- visões para os gráficos ----
+    def _tabela(self, contador, colunas, valor):
+        with self._trava:
+            itens = [(*k, v) for k, v in contador.items() if v]
+        return pd.DataFrame(itens, columns=colunas + [valor])
+
+    def minutos_por_semana(self):
+        return self._tabela(self.minutos_semana, ["Agente", "Semana", "Mês"], "Minutos")
+
+    def minutos_por_mes(self):
+        return self._tabela(self.minutos_mes, ["Agente", "Mês"], "Minutos")
+
+    def trocas_por_mes(self):
+        return self._tabela(self.trocas_mes, ["Agente", "Mês"], "Trocas")
+
+    def taxa_aprovacao(self, contador):
+        decididas = contador[APROVADO] + contador[REPROVADO]
+        return contador[APROVADO] / decididas if decididas else None
+
+
+def folgas_por_dia(indice):
+    # Agentes de folga e trabalhando em cada dia da escala
+    if not len(indice):
+        return pd.DataFrame({"Folgas": [], "Trabalhando": []}, index=pd.DatetimeIndex([], name="Data"), dtype=int)
+    dias, posicao = np.unique(indice.dia, return_inverse=True)
+    folga = indice.h_folga[indice.cod_horario]
+    trabalha = indice.h_trabalha[indice.cod_horario]
+    return pd.DataFrame({
+        "Folgas": np.bincount(posicao, weights=folga, minlength=len(dias)).astype(int),
+        "Trabalhando": np.bincount(posicao, weights=trabalha, minlength=len(dias)).astype(int),
+    }, index=pd.DatetimeIndex([date.fromordinal(int(d)) for d in dias], name="Data"))
+
+
+def cobertura_folgas():
+    indice = dados.derivado("escala", "indice", IndiceEscala)
+    return dados.derivado("escala", "folgas_por_dia", lambda _: folgas_por_dia(indice))
+
+
+agregados = Agregados()
@@ -0,0 +1,612 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# =========================
+# ARMAZENAMENTO EM CSV (APPEND-ONLY)
+# =========================
+# Novas linhas são acrescentadas no fim do arquivo, sem reescrever o
+# histórico. Mudanças de status (aprovar/reprovar) vão para um diário
+# "<arquivo>.journal" com uma linha JSON por alteração, que é aplicado na
+# leitura e consolidado no CSV em segundo plano quando cresce demais.
+# Toda escrita acontece com o arquivo travado, então dois gestores
+# aprovando ao mesmo tempo não perdem a alteração um do outro.
+#
+# O id de uma linha é a sua posição no CSV (o índice do DataFrame lido).
+# Como as linhas nunca mudam de lugar, o id continua válido após a
+# consolidação. A exceção é remover(), usado só na retenção de dados antigos:
+# ele incrementa a geração do arquivo ("<arquivo>.geracao"), e atualizar() e
+# remover() com a geração em que os ids foram lidos não gravam nada se ela
+# mudou.
+#
+# Cada linha do diário guarda a identidade do CSV (tamanho e hash do
+# conteúdo) sobre a qual foi escrita, e cada append do app grava a nova
+# identidade no diário. Se o CSV for trocado por fora do app, a identidade
+# não confere e o diário é ignorado: as posições dele apontariam para outras
+# linhas. Na próxima escrita ele é renomeado para
+# "<arquivo>.journal.<data>.descartado", nunca apagado, para que as
+# alterações possam ser conferidas e refeitas à mão. Só o conteúdo conta:
+# um backup ou os.utime que mexa só no mtime não invalida o diário.
+
+LIMITE_DIARIO = 256 * 1024  # bytes no diário antes de consolidar
+
+# =========================
+# TABELAS
+# =========================
+ARQUIVOS = {
+    "usuarios": "usuarios.csv",
+    "escala": "Escala.csv",
+    "hora_extra": "HoraExtra.csv",
+    "trocas": "TrocaFolga.csv",
+    "notificacoes": "Notificacoes.csv",
+}
+
+COLUNAS = {
+    "usuarios": ["Usuario", "Senha", "Tipo"],
+    "escala": ["Nome", "Data", "Horário", "Pausa"],
+    "hora_extra": ["Nome", "Dia", "Horas", "Motivo", "Status", "Aprovador"],
+    "trocas": ["Nome", "Tipo", "Data Origem", "Nova Data", "Motivo", "Status", "PessoaTroca", "Aprovador"],
+    "notificacoes": ["Usuario", "Mensagem", "Status", "DataHora"],
+}
+
+# Índices do SQLite. Comparações de texto são sem diferenciar maiúsculas,
+# como o app já fazia com str.lower().
+INDICES = {
+    "escala": [("Nome", "Data")],
+    "hora_extra": [("Status",), ("Nome", "Status")],
+    "trocas": [("Status",), ("Nome", "Status")],
+    "notificacoes": [("Usuario", "Status")],
+}
+
+_travas = {}
+_travas_lock = threading.Lock()
+_consolidando = set()
+_hashes = {}                # path -> (stat, hash do conteúdo)
+
+
+def caminho_diario(path):
+    return path + ".journal"
+
+
+def caminho_geracao(path):
+    return path + ".geracao"
+
+
+def geracao(path):
+    # Quantas vezes remover() já mudou as posições das linhas
+    try:
+        with open(caminho_geracao(path), encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _trava_local(path):
+    with _travas_lock:
+        if path not in _travas:
+            _travas[path] = threading.RLock()
+        return _travas[path]
+
+
+@contextmanager
+def trava(path):
+    # Trava entre threads (sessões do mesmo processo) e entre processos
+    with _trava_local(path):
+        with open(path + ".lock", "a+") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def assinatura(path):
+    # Versão da tabela = (mtime, tamanho) do CSV e do diário
+    def _stat(p):
+        try:
+            s = os.stat(p)
+        except OSError:
+            return None
+        return (s.st_mtime_ns, s.st_size)
+    return (_stat(path), _stat(caminho_diario(path)))
+
+
+def _identidade(path):
+    # [tamanho, sha1 do conteúdo]; o hash é recalculado só quando o stat
+    # do arquivo muda
+    try:
+        s = os.stat(path)
+    except OSError:
+        return None
+    chave = (s.st_ino, s.st_mtime_ns, s.st_size)
+    with _travas_lock:
+        guardado = _hashes.get(path)
+    if guardado and guardado[0] == chave:
+        return [s.st_size, guardado[1]]
+    h = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for bloco in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloco)
+    except OSError:
+        return None
+    with _travas_lock:
+        _hashes[path] = (chave, h.hexdigest())
+    return [s.st_size, h.hexdigest()]
+
+
+def _confere(base, path):
+    identidade = _identidade(path)
+    if len(base) == 3:
+        # Diário de antes do hash: [inode, mtime, tamanho]; confere só o tamanho
+        return identidade is not None and base[2] == identidade[0]
+    return base == identidade
+
+
+def _cabecalho(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def _valor(v):
+    if v is None:
+        return ""
+    try:
+        if pd.isna(v):
+            return ""
+    except (TypeError, ValueError):
+        pass
+    return str(v)
+
+
+def _ler_diario(path):
+    entradas = []
+    try:
+        with open(caminho_diario(path), encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    entradas.append(json.loads(linha))
+                except ValueError:
+                    continue  # linha incompleta de uma escrita interrompida
+    except OSError:
+        pass
+    return entradas
+
+
+def _diario_valido(path, entradas):
+    # Entradas gravadas sobre o CSV atual; [] se ele foi trocado por fora.
+    # Diários antigos, sem identidade, continuam valendo.
+    bases = [e["base"] for e in entradas if "base" in e]
+    if bases and not _confere(bases[-1], path):
+        return []
+    return [e for e in entradas if "campos" in e]
+
+
+def _descartar_diario_obsoleto(path):
+    # Chamado com o arquivo travado, antes de escrever: tira do caminho um
+    # diário que não vale para o CSV atual, guardando-o ao lado
+    entradas = _ler_diario(path)
+    if entradas and not _diario_valido(path, entradas):
+        destino = f"{caminho_diario(path)}.{time.strftime('%Y%m%d-%H%M%S')}.descartado"
+        try:
+            os.replace(caminho_diario(path), destino)
+        except OSError:
+            pass
+
+
+def _gravar_diario(path, entrada):
+    with open(caminho_diario(path), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        return f.tell()
+
+
+def _aplicar_diario(df, entradas):
+    # A última escrita de cada (linha, coluna) vence; cada coluna é
+    # convertida e atribuída uma vez só, qualquer que seja o tamanho do diário
+    por_coluna = {}
+    for entrada in entradas:
+        for col, valor in entrada["campos"].items():
+            valores = por_coluna.setdefault(col, {})
+            for i in entrada["linhas"]:
+                valores[i] = valor
+    for col, valores in por_coluna.items():
+        linhas = [i for i in valores if i in df.index]
+        if col not in df.columns:
+            df[col] = pd.NA
+        if df[col].dtype != object:
+            df[col] = df[col].astype(object)
+        if linhas:
+            df.loc[linhas, col] = [valores[i] for i in linhas]
+    return df
+
+
+def _ler(path):
+    try:
+        df = pd.read_csv(path, encoding="utf-8-sig")
+    except:
+        return pd.DataFrame()
+    return _aplicar_diario(df, _diario_valido(path, _ler_diario(path)))
+
+
+def ler(path):
+    with trava(path):
+        return _ler(path)
+
+
+def _reescrever(path, df):
+    # df já tem o diário aplicado; um diário obsoleto é guardado, não apagado
+    _descartar_diario_obsoleto(path)
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False, encoding="utf-8-sig")
+    os.replace(tmp, path)
+    try:
+        os.remove(caminho_diario(path))
+    except OSError:
+        pass
+
+
+def anexar(path, registros):
+    if not registros:
+        return
+    with trava(path):
+        _descartar_diario_obsoleto(path)
+        cabecalho = _cabecalho(path) if os.path.exists(path) else []
+        colunas = set().union(*(r.keys() for r in registros))
+        if not cabecalho or not colunas.issubset(cabecalho):
+            # Coluna nova: único caso em que o arquivo inteiro é reescrito
+            df = pd.concat([_ler(path), pd.DataFrame(registros)], ignore_index=True)
+            _reescrever(path, df)
+            return
+        # Garante que a linha nova não grude numa última linha sem quebra
+        quebra = False
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                quebra = f.read(1) != b"\n"
+        with open(path, "a", encoding="utf-8", newline="") as f:
+            if quebra:
+                f.write("\n")
+            w = csv.writer(f, lineterminator="\n")
+            for r in registros:
+                w.writerow([_valor(r.get(c)) for c in cabecalho])
+        # O CSV mudou de identidade pelo próprio app: o diário continua valendo
+        if os.path.exists(caminho_diario(path)):
+            _gravar_diario(path, {"base": _identidade(path)})
+
+
+def atualizar(path, linhas, campos, geracao_ids=None):
+    # Com geracao_ids (a geração em que os ids foram lidos), não grava se o
+    # arquivo foi reescrito por remover() desde então; devolve se gravou
+    linhas = [int(i) for i in linhas]
+    if not linhas:
+        return True
+    with trava(path):
+        if geracao_ids is not None and geracao_ids != geracao(path):
+            return False
+        _descartar_diario_obsoleto(path)
+        entrada = {"base": _identidade(path), "linhas": linhas, "campos": {k: _valor(v) for k, v in campos.items()}}
+        tamanho = _gravar_diario(path, entrada)
+    if tamanho > LIMITE_DIARIO:
+        consolidar_em_segundo_plano(path)
+    return True
+
+
+def remover(path, linhas, geracao_ids=None):
+    # Usado só na retenção de dados antigos: como reescreve o arquivo, as
+    # linhas seguintes mudam de posição (e de id). Com geracao_ids, não
+    # remove nada se outro remover() passou antes; devolve se removeu
+    linhas = {int(i) for i in linhas}
+    if not linhas:
+        return True
+    with trava(path):
+        if geracao_ids is not None and geracao_ids != geracao(path):
+            return False
+        df = _ler(path)
+        _reescrever(path, df[~df.index.isin(linhas)])
+        with open(caminho_geracao(path), "w", encoding="utf-8") as f:
+            f.write(str(geracao(path) + 1))
+    return True
+
+
+def consolidar(path):
+    # Aplica o diário no CSV e apaga o diário
+    with trava(path):
+        if not os.path.exists(caminho_diario(path)):
+            return
+        _reescrever(path, _ler(path))
+
+
+def consolidar_em_segundo_plano(path):
+    with _travas_lock:
+        if path in _consolidando:
+            return
+        _consolidando.add(path)
+
+    def _rodar():
+        try:
+            consolidar(path)
+        finally:
+            with _travas_lock:
+                _consolidando.discard(path)
+
+    threading.Thread(target=_rodar, daemon=True).start()
+
+
+def ensure_csv(path, cols):
+    if not os.path.exists(path):
+        pd.DataFrame(columns=cols).to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def filtrar(df, filtros):
+    # Igualdade sem diferenciar maiúsculas, coluna a coluna
+    mascara = pd.Series(True, index=df.index)
+    for col, valor in filtros.items():
+        if col not in df.columns:
+            return df.iloc[0:0]
+        mascara &= df[col].astype(str).str.lower() == str(valor).lower()
+    return df[mascara]
+
+
+# =========================
+# BACKENDS
+# =========================
+# Os dois backends expõem a mesma interface por nome de tabela:
+# garantir, assinatura, geracao, ler, consultar, anexar, atualizar, remover,
+# consolidar e aplicar
+# (um lote de operações ("anexar", tabela, registros) / ("atualizar", tabela,
+# ids, campos) / ("remover", tabela, ids) / ("consolidar", tabela)). O id de
+# linha é o índice do DataFrame retornado por ler() (posição no CSV ou rowid).
+
+class BackendCSV:
+    indexado = False
+
+    def __init__(self, base):
+        self.base = base
+
+    def caminho(self, tabela):
+        return os.path.join(self.base, ARQUIVOS[tabela])
+
+    def garantir(self):
+        for tabela, cols in COLUNAS.items():
+            ensure_csv(self.caminho(tabela), cols)
+
+    def assinatura(self, tabela):
+        return assinatura(self.caminho(tabela))
+
+    def ler(self, tabela):
+        return ler(self.caminho(tabela))
+
+    def consultar(self, tabela, filtros):
+        return filtrar(self.ler(tabela), filtros)
+
+    def anexar(self, tabela, registros):
+        anexar(self.caminho(tabela), registros)
+
+    def geracao(self, tabela):
+        return geracao(self.caminho(tabela))
+
+    def atualizar(self, tabela, ids, campos, geracao_ids=None):
+        return atualizar(self.caminho(tabela), ids, campos, geracao_ids)
+
+    def remover(self, tabela, ids, geracao_ids=None):
+        return remover(self.caminho(tabela), ids, geracao_ids)
+
+    def consolidar(self, tabela):
+        consolidar(self.caminho(tabela))
+
+    def aplicar(self, operacoes):
+        # Cada operação é um append no arquivo da sua tabela
+        for op, tabela, *args in operacoes:
+            getattr(self, op)(tabela, *args)
+
+
+def _q(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+
+class BackendSQLite:
+    # Um arquivo SQLite local em modo WAL: leituras não bloqueiam escritas e
+    # cada escrita é uma transação. A tabela _versoes guarda um contador por
+    # tabela, incrementado na mesma transação da escrita, que serve de
+    # assinatura para o cache de dados.py.
+    indexado = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def conexao(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def _colunas(self, tabela):
+        return [r[1] for r in self.conexao().execute(f"PRAGMA table_info({_q(tabela)})")]
+
+    def garantir(self):
+        con = self.conexao()
+        with con:
+            con.execute("CREATE TABLE IF NOT EXISTS _versoes (tabela TEXT PRIMARY KEY, versao INTEGER NOT NULL)")
+            for tabela, cols in COLUNAS.items():
+                con.execute(f"CREATE TABLE IF NOT EXISTS {_q(tabela)} ({', '.join(_q(c) + ' TEXT' for c in cols)})")
+                con.execute("INSERT OR IGNORE INTO _versoes VALUES (?, 0)", (tabela,))
+                for cols_idx in INDICES.get(tabela, []):
+                    nome = "idx_" + tabela + "_" + "_".join(c.lower() for c in cols_idx)
+                    partes = ", ".join(_q(c) + ("" if c == "Data" else " COLLATE NOCASE") for c in cols_idx)
+                    con.execute(f"CREATE INDEX IF NOT EXISTS {_q(nome)} ON {_q(tabela)} ({partes})")
+
+    def _incrementar(self, con, tabela):
+        con.execute("UPDATE _versoes SET versao = versao + 1 WHERE tabela = ?", (tabela,))
+
+    def _garantir_colunas(self, con, tabela, colunas):
+        existentes = set(self._colunas(tabela))
+        for c in colunas:
+            if c not in existentes:
+                con.execute(f"ALTER TABLE {_q(tabela)} ADD COLUMN {_q(c)} TEXT")
+
+    def assinatura(self, tabela):
+        linha = self.conexao().execute("SELECT versao FROM _versoes WHERE tabela = ?", (tabela,)).fetchone()
+        return (self.path, linha[0] if linha else None)
+
+    def _select(self, tabela, where="", params=()):
+        df = pd.read_sql_query(f"SELECT rowid AS _id, * FROM {_q(tabela)}{where}", self.conexao(), params=params, index_col="_id")
+        df.index.name = None
+        return df
+
+    def ler(self, tabela):
+        return self._select(tabela)
+
+    def consultar(self, tabela, filtros):
+        if not set(filtros).issubset(self._colunas(tabela)):
+            return self._select(tabela, " WHERE 0")
+        where = " AND ".join(f"{_q(c)} = ? COLLATE NOCASE" for c in filtros)
+        return self._select(tabela, " WHERE " + where if where else "", [str(v) for v in filtros.values()])
+
+    def _anexar(self, con, tabela, registros):
+        if not registros:
+            return
+        colunas = list(dict.fromkeys(c for r in registros for c in r))
+        self._garantir_colunas(con, tabela, colunas)
+        con.executemany(
+            f"INSERT INTO {_q(tabela)} ({', '.join(map(_q, colunas))}) VALUES ({', '.join('?' * len(colunas))})",
+            [[_valor(r.get(c)) or None for c in colunas] for r in registros],
+        )
+        self._incrementar(con, tabela)
+
+    def _atualizar(self, con, tabela, ids, campos):
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        self._garantir_colunas(con, tabela, campos)
+        sets = ", ".join(f"{_q(c)} = ?" for c in campos)
+        valores = [_valor(v) or None for v in campos.values()]
+        con.executemany(f"UPDATE {_q(tabela)} SET {sets} WHERE rowid = ?", [valores + [i] for i in ids])
+        self._incrementar(con, tabela)
+
+    def _remover(self, con, tabela, ids):
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        con.executemany(f"DELETE FROM {_q(tabela)} WHERE rowid = ?", [(i,) for i in ids])
+        self._incrementar(con, tabela)
+
+    def _consolidar(self, con, tabela):
+        pass
+
+    def anexar(self, tabela, registros):
+        self.aplicar([("anexar", tabela, registros)])
+
+    def remover(self, tabela, ids, geracao_ids=None):
+        self.aplicar([("remover", tabela, ids)])
+        return True
+
+    def consolidar(self, tabela):
+        pass  # sem diário: cada escrita já é definitiva
+
+    def geracao(self, tabela):
+        return 0  # rowid não muda quando outras linhas são apagadas
+
+    def atualizar(self, tabela, ids, campos, geracao_ids=None):
+        self.aplicar([("atualizar", tabela, ids, campos)])
+        return True
+
+    def aplicar(self, operacoes):
+        # Todas as operações numa transação só
+        con = self.conexao()
+        with con:
+            for op, tabela, *args in operacoes:
+                getattr(self, "_" + op)(con, tabela, *args)
+
+
+def importar_csvs(base, db_path):
+    # Importação única dos CSVs (com diário aplicado) para o SQLite
+    origem = BackendCSV(base)
+    destino = BackendSQLite(db_path)
+    destino.garantir()
+    con = destino.conexao()
+    totais = {}
+    for tabela in ARQUIVOS:
+        path = origem.caminho(tabela)
+        df = ler(path) if os.path.exists(path) else pd.DataFrame()
+        # Cabeçalho com problema de encoding
+        df = df.rename(columns={"HorÃ¡rio": "Horário"})
+        with con:
+            con.execute(f"DELETE FROM {_q(tabela)}")
+            destino._garantir_colunas(con, tabela, list(df.columns))
+            if not df.empty:
+                colunas = list(df.columns)
+                con.executemany(
+                    f"INSERT INTO {_q(tabela)} ({', '.join(map(_q, colunas))}) VALUES ({', '.join('?' * len(colunas))})",
+                    [[_valor(v) or None for v in linha] for linha in df.itertuples(index=False)],
+                )
+            destino._incrementar(con, tabela)
+        totais[tabela] = len(df)
+    return totais
+
+
+# =========================
+# BACKEND ATIVO
+# =========================
+# ESCALA_BACKEND=csv (padrão) ou sqlite; ESCALA_DB aponta o arquivo SQLite.
+BASE = os.getcwd()
+_backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        if os.environ.get("ESCALA_BACKEND", "csv").strip().lower() == "sqlite":
+            _backend = BackendSQLite(os.environ.get("ESCALA_DB", os.path.join(BASE, "escala.db")))
+        else:
+            _backend = BackendCSV(BASE)
+    return _backend
+
+
+def configurar(novo):
+    global _backend
+    _backend = novo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ferramentas de armazenamento do WFM Atlas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_imp = sub.add_parser("importar", help="importa os CSVs para um arquivo SQLite")
+    p_imp.add_argument("--base", default=BASE, help="pasta dos CSVs")
+    p_imp.add_argument("--db", default=os.path.join(BASE, "escala.db"), help="arquivo SQLite de destino")
+    p_con = sub.add_parser("consolidar", help="aplica os diários pendentes nos CSVs")
+    p_con.add_argument("--base", default=BASE, help="pasta dos CSVs")
+    args = parser.parse_args()
+
+    if args.comando == "importar":
+        for tabela, total in importar_csvs(args.base, args.db).items():
+            print(f"{tabela}: {total} linhas")
+    elif args.comando == "consolidar":
+        origem = BackendCSV(args.base)
+        for tabela in ARQUIVOS:
+            consolidar(origem.caminho(tabela))
@@ -0,0 +1,161 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import time
+import dados
+
+# =========================
+# AUTENTICAÇÃO
+# =========================
+# Os usuários ficam num dicionário por nome normalizado, montado uma vez
+# por versão da tabela (dados.derivado), então o login é uma consulta O(1)
+# e uma verificação de hash. As senhas são gravadas como
+# "pbkdf2_sha256$<iterações>$<sal>$<hash>"; o número de iterações é
+# calibrado para um orçamento de tempo medido na máquina (ver calibrar) e
+# fica gravado em cada hash, o que limita o custo de cada verificação.
+# Senhas ainda em texto puro continuam aceitas até a migração.
+
+ALGORITMO = "pbkdf2_sha256"
+ORCAMENTO_MS = 50
+ITERACOES_MINIMAS = 50_000
+
+
+def _b64(b):
+    return base64.b64encode(b).decode("ascii")
+
+
+def calibrar(orcamento_ms=ORCAMENTO_MS):
+    # Iterações que cabem no orçamento, medidas nesta máquina
+    amostra = 20_000
+    inicio = time.perf_counter()
+    hashlib.pbkdf2_hmac("sha256", b"calibragem", b"0" * 16, amostra)
+    por_iteracao = (time.perf_counter() - inicio) / amostra
+    return max(ITERACOES_MINIMAS, int(orcamento_ms / 1000 / por_iteracao))
+
+
+def gerar_hash(senha, iteracoes):
+    sal = os.urandom(16)
+    h = hashlib.pbkdf2_hmac("sha256", str(senha).encode("utf-8"), sal, iteracoes)
+    return f"{ALGORITMO}${iteracoes}${_b64(sal)}${_b64(h)}"
+
+
+def eh_hash(valor):
+    return str(valor).startswith(ALGORITMO + "$")
+
+
+def verificar(senha, armazenada):
+    if armazenada is None:
+        return False
+    armazenada = str(armazenada)
+    if not eh_hash(armazenada):
+        # Legado: senha em texto puro
+        return hmac.compare_digest(str(senha).encode("utf-8"), armazenada.encode("utf-8"))
+    try:
+        _, iteracoes, sal, esperado = armazenada.split("$")
+        h = hashlib.pbkdf2_hmac("sha256", str(senha).encode("utf-8"), base64.b64decode(sal), int(iteracoes))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(_b64(h), esperado)
+
+
+def _iteracoes(armazenada):
+    try:
+        return int(str(armazenada).split("$")[1]) if eh_hash(armazenada) else 0
+    except (IndexError, ValueError):
+        return 0
+
+
+def _senha(valor):
+    # Senhas numéricas podem vir como float (ex.: 9827.0) quando há células
+    # vazias na coluna; vazia vira None e nunca confere
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+class IndiceUsuarios:
+    def __init__(self, df):
+        # usuario normalizado -> (id, Usuario, Senha, Tipo)
+        self.por_login = {}
+        self.hash_ficticio = None
+        if df.empty or "Usuario" not in df.columns:
+            return
+        senhas = df["Senha"] if "Senha" in df.columns else [None] * len(df)
+        tipos = df["Tipo"] if "Tipo" in df.columns else [""] * len(df)
+        for ident, u, s, t in zip(df.index, df["Usuario"], senhas, tipos):
+            if isinstance(u, str) and u.strip():
+                self.por_login[u.strip().lower()] = (ident, u, _senha(s), str(t))
+        # Hash conferido quando o usuário não existe, com as mesmas
+        # iterações dos gravados (ou as calibradas, se ainda não há hash),
+        # para o tempo de resposta não denunciar quais logins são válidos
+        iteracoes = max((_iteracoes(r[2]) for r in self.por_login.values()), default=0)
+        self.hash_ficticio = gerar_hash("", iteracoes or _calibradas())
+
+    def __len__(self):
+        return len(self.por_login)
+
+
+_calibragem = []
+
+
+def _calibradas():
+    # calibrar() uma vez por processo
+    if not _calibragem:
+        _calibragem.append(calibrar())
+    return _calibragem[0]
+
+
+def indice():
+    return dados.derivado("usuarios", "login", IndiceUsuarios)
+
+
+def autenticar(login, senha):
+    # (Usuario, Tipo) ou None
+    usuarios = indice()
+    registro = usuarios.por_login.get(str(login or "").strip().lower())
+    if registro is None:
+        verificar(senha, usuarios.hash_ficticio or gerar_hash("", _calibradas()))
+        return None
+    _, usuario, armazenada, tipo = registro
+    if not eh_hash(armazenada):
+        # Senha legada em texto puro: a mesma conta de hash de um usuário
+        # inexistente, para o tempo ser igual
+        verificar(senha, usuarios.hash_ficticio)
+    if not verificar(senha, armazenada):
+        return None
+    return usuario, tipo
+
+
+def migrar(orcamento_ms=ORCAMENTO_MS):
+    # Troca as senhas em texto puro por hashes; devolve quantas migrou
+    iteracoes = calibrar(orcamento_ms)
+    operacoes = [
+        ("atualizar", "usuarios", [ident], {"Senha": gerar_hash(s, iteracoes)})
+        for ident, _, s, _ in indice().por_login.values()
+        if s is not None and not eh_hash(s)
+    ]
+    if operacoes:
+        dados.aplicar(operacoes)
+        dados.consolidar("usuarios")
+    return len(operacoes), iteracoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ferramentas de senha do WFM Atlas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_mig = sub.add_parser("migrar", help="troca as senhas em texto puro do usuarios por hashes")
+    p_mig.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_MS, help="tempo alvo de uma verificação")
+    p_cal = sub.add_parser("calibrar", help="mostra as iterações que cabem no orçamento")
+    p_cal.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_MS, help="tempo alvo de uma verificação")
+    args = parser.parse_args()
+
+    if args.comando == "migrar":
+        dados.garantir_tabelas()
+        total, iteracoes = migrar(args.orcamento_ms)
+        print(f"{total} senhas migradas ({iteracoes} iterações)")
+    elif args.comando == "calibrar":
+        print(calibrar(args.orcamento_ms))
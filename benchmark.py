@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import armazenamento
+import calendario
+import cobertura
+import dados
+from indice_escala import IndiceEscala
+
+# =========================
+# BENCHMARK DOS CAMINHOS QUENTES
+# =========================
+# Gera uma base sintética (escala de N agentes x M dias, mais hora extra,
+# trocas e notificações proporcionais) numa pasta temporária, aponta o
+# backend para ela e mede o que o app faz a cada rerun: leitura da tabela,
+# índice, calendário, agentes disponíveis, lista de pendentes e gravação de
+# uma aprovação. Para cada etapa mostra a mediana do tempo e o pico de
+# memória (tracemalloc, numa execução separada para não distorcer o tempo).
+#
+#   python benchmark.py                         # 1k, 100k e 1M linhas
+#   python benchmark.py --linhas 100000 --backend sqlite --saida base.json
+#   python benchmark.py --linhas 100000 --comparar base.json
+
+TAMANHOS = [1_000, 100_000, 1_000_000]
+REPETICOES = 5
+TEMPO_MAXIMO = 2.0      # segundos por etapa; etapas lentas repetem menos
+POR_PAGINA = 25         # como no painel de aprovação
+
+TURNOS = [
+    ("07:00 - 13:00", "09:00"), ("08:00 - 14:00", "10:15"), ("09:00 - 15:00", "11:00"),
+    ("11:00 - 17:00", "14:00"), ("13:00 - 19:00", "16:00"), ("14:00 - 20:00", "17:00"),
+    ("17:00 - 23:00", "20:00"), ("18:00 - 23:59", "23:10"),
+]
+INICIO = pd.Timestamp("2025-01-01")
+
+
+# =========================
+# GERADOR DE DADOS
+# =========================
+def dimensoes(linhas):
+    # Até um ano de escala; o resto vira agentes
+    dias = 365 if linhas >= 3650 else max(linhas // 10, 1)
+    return max(linhas // dias, 1), dias
+
+
+def gerar_base(pasta, linhas, semente=0):
+    # Escreve os CSVs de uma base sintética com ~"linhas" linhas de escala
+    rng = np.random.default_rng(semente)
+    agentes, dias = dimensoes(linhas)
+    nomes = np.array([f"Agente {i:05d}" for i in range(agentes)], dtype=object)
+    datas = pd.date_range(INICIO, periods=dias, freq="D")
+
+    # Escala: cada agente tem um turno fixo e folga em 2 dias da semana
+    a = np.repeat(np.arange(agentes), dias)
+    d = np.tile(np.arange(dias), agentes)
+    turno = a % len(TURNOS)
+    folga = ((d + a) % 7) >= 5
+    horarios = np.array([t[0] for t in TURNOS], dtype=object)[turno]
+    pausas = np.array([t[1] for t in TURNOS], dtype=object)[turno]
+    escala = pd.DataFrame({
+        "Nome": nomes[a],
+        "Data": datas.strftime("%d/%m/%Y").to_numpy()[d],
+        "Horário": np.where(folga, "FOLGA", horarios),
+        "Pausa": np.where(folga, "-", pausas),
+    })
+
+    def status(n):
+        return rng.choice(["Pendente", "Aprovado", "Reprovado"], size=n, p=[0.2, 0.6, 0.2])
+
+    n = max(linhas // 10, 1)
+    hora_extra = pd.DataFrame({
+        "Nome": nomes[rng.integers(0, agentes, n)],
+        "Dia": datas.strftime("%Y-%m-%d").to_numpy()[rng.integers(0, dias, n)],
+        "Horas": rng.choice(["00:30", "01:00", "01:30", "02:00"], size=n),
+        "Motivo": "Demanda",
+        "Status": status(n),
+        "Aprovador": "",
+    })
+    n = max(linhas // 20, 1)
+    origem = rng.integers(0, dias, n)
+    trocas = pd.DataFrame({
+        "Nome": nomes[rng.integers(0, agentes, n)],
+        "Tipo": rng.choice(["Troca de folga", "Troca de horário"], size=n),
+        "Data Origem": datas.strftime("%Y-%m-%d").to_numpy()[origem],
+        "Nova Data": datas.strftime("%Y-%m-%d").to_numpy()[np.minimum(origem + rng.integers(1, 7, n), dias - 1)],
+        "Motivo": "",
+        "Status": status(n),
+        "PessoaTroca": nomes[rng.integers(0, agentes, n)],
+        "Aprovador": "",
+    })
+    n = max(linhas // 5, 1)
+    notificacoes = pd.DataFrame({
+        "Usuario": np.where(rng.random(n) < 0.3, "adm", nomes[rng.integers(0, agentes, n)]),
+        "Mensagem": "Sua hora extra foi aprovada.",
+        "Status": rng.choice(["Nao Lida", "Lida"], size=n, p=[0.3, 0.7]),
+        "DataHora": (INICIO + pd.to_timedelta(rng.integers(0, dias * 86400, n), unit="s")).strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    usuarios = pd.DataFrame({"Usuario": list(nomes) + ["adm"], "Senha": "1234", "Tipo": ["agente"] * agentes + ["adm"]})
+
+    for tabela, df in [("escala", escala), ("hora_extra", hora_extra), ("trocas", trocas),
+                       ("notificacoes", notificacoes), ("usuarios", usuarios)]:
+        df.to_csv(os.path.join(pasta, armazenamento.ARQUIVOS[tabela]), index=False, encoding="utf-8-sig")
+    return {"agentes": agentes, "dias": dias, "escala": len(escala), "hora_extra": len(hora_extra),
+            "trocas": len(trocas), "notificacoes": len(notificacoes)}
+
+
+# =========================
+# MEDIÇÃO
+# =========================
+def medir(funcao, repeticoes=REPETICOES):
+    # (mediana em ms, pico de memória em KiB). A primeira execução só
+    # aquece os caches do processo, como o primeiro rerun do app.
+    funcao()
+    tempos = []
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        t = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - t)
+        if time.perf_counter() - inicio > TEMPO_MAXIMO:
+            break
+    tracemalloc.start()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(tempos) * 1000, pico / 1024
+
+
+def etapas(info):
+    # (nome, função) na ordem em que o app as executa
+    agente = "Agente 00000"
+    dia = (INICIO + pd.Timedelta(days=info["dias"] // 2)).date()
+    indice = {}
+    aprovadas = iter(range(10 ** 9))
+
+    def leitura_fria():
+        dados.invalidar("escala")
+        dados.carregar("escala")
+
+    def construir_indice():
+        indice["i"] = IndiceEscala(dados.carregar("escala"))
+
+    def indice_compartilhado():
+        return dados.derivado("escala", "indice", IndiceEscala)
+
+    def calendario_gerar():
+        i = indice_compartilhado()
+        calendario.html_mes(i.turnos(agente), dia.year, dia.month)
+
+    def calendario_cache():
+        calendario.calendario_agente(indice_compartilhado(), agente, dia.year, dia.month)
+
+    def agentes_disponiveis():
+        [{"nome": n, "horario": t.horario} for n, t in indice_compartilhado().trabalhando(dia, excluir=agente)]
+
+    def construir_cobertura():
+        cobertura.Cobertura(indice_compartilhado())
+
+    def lista_pendentes():
+        # O que o painel de aprovação faz: filtra, converte as datas para o
+        # filtro de período, pagina e confere a cobertura da página
+        pendentes = dados.consultar("hora_extra", Status="pendente")
+        texto = pendentes["Dia"].astype(str)
+        pd.to_datetime(texto, format="%Y-%m-%d", errors="coerce").fillna(
+            pd.to_datetime(texto, format="%d/%m/%Y", errors="coerce")).dt.date
+        trecho = pendentes.iloc[:POR_PAGINA]
+        cobertura.avaliar_lote("hora_extra", trecho)
+
+    def aprovacao():
+        # Um lote de POR_PAGINA aprovações, como decidir_em_lote, seguido da
+        # releitura que o rerun faz (as notificações vão para a fila de tarefas)
+        k = next(aprovadas)
+        ids = list(range(k * POR_PAGINA, (k + 1) * POR_PAGINA))
+        dados.atualizar("hora_extra", ids, {"Status": "Aprovado", "Aprovador": "adm"})
+        dados.carregar("hora_extra")
+
+    def notificacoes():
+        # O que a tarefa "notificar" grava depois, fora do clique
+        dados.anexar("notificacoes", [{"Usuario": agente, "Mensagem": "Sua hora extra foi aprovada.",
+                                       "Status": "Nao Lida", "DataHora": pd.Timestamp.now()}] * POR_PAGINA)
+
+    return [
+        ("leitura da escala (fria)", leitura_fria),
+        ("leitura da escala (cache)", lambda: dados.carregar("escala")),
+        ("índice da escala", construir_indice),
+        ("calendário do agente (gerar)", calendario_gerar),
+        ("calendário do agente (cache)", calendario_cache),
+        ("obter_agentes_disponiveis", agentes_disponiveis),
+        ("cobertura da escala", construir_cobertura),
+        ("lista de pendentes", lista_pendentes),
+        ("aprovação em lote", aprovacao),
+        ("notificações (fila)", notificacoes),
+    ]
+
+
+def rodar(linhas, backend="csv", pasta=None):
+    # Mede uma base de "linhas" linhas; devolve [{tamanho, etapa, ms, pico_kib}]
+    temporaria = pasta is None
+    pasta = pasta or tempfile.mkdtemp(prefix="escala_bench_")
+    anterior = armazenamento.backend()
+    try:
+        info = gerar_base(pasta, linhas)
+        if backend == "sqlite":
+            db = os.path.join(pasta, "escala.db")
+            armazenamento.importar_csvs(pasta, db)
+            dados.usar_backend(armazenamento.BackendSQLite(db))
+        else:
+            dados.usar_backend(armazenamento.BackendCSV(pasta))
+        calendario._cache.limpar()
+        resultados = []
+        for nome, funcao in etapas(info):
+            ms, pico = medir(funcao)
+            resultados.append({"tamanho": linhas, "backend": backend, "etapa": nome, "ms": round(ms, 3), "pico_kib": round(pico, 1)})
+        return info, resultados
+    finally:
+        dados.usar_backend(anterior)
+        calendario._cache.limpar()
+        if temporaria:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+
+def imprimir(info, resultados, anteriores=None):
+    anteriores = {(r["tamanho"], r["backend"], r["etapa"]): r for r in anteriores or []}
+    print(f"\n{info['escala']:,} linhas de escala ({info['agentes']} agentes x {info['dias']} dias), "
+          f"{info['hora_extra']:,} horas extras, {info['trocas']:,} trocas, {info['notificacoes']:,} notificações")
+    print(f"{'etapa':<32}{'ms':>12}{'pico KiB':>14}{'vs. anterior':>16}")
+    for r in resultados:
+        antes = anteriores.get((r["tamanho"], r["backend"], r["etapa"]))
+        comparacao = f"{r['ms'] / antes['ms']:.2f}x" if antes and antes["ms"] else ""
+        print(f"{r['etapa']:<32}{r['ms']:>12.3f}{r['pico_kib']:>14.1f}{comparacao:>16}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dos caminhos quentes do WFM Atlas com dados sintéticos")
+    parser.add_argument("--linhas", type=int, nargs="+", default=TAMANHOS, help="linhas de escala de cada base")
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--saida", help="grava os resultados neste JSON")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior, para comparar os tempos")
+    parser.add_argument("--gerar", metavar="PASTA", help="só gera a base sintética nesta pasta (com a primeira --linhas)")
+    args = parser.parse_args()
+
+    if args.gerar:
+        os.makedirs(args.gerar, exist_ok=True)
+        print(gerar_base(args.gerar, args.linhas[0]))
+    else:
+        anteriores = None
+        if args.comparar:
+            with open(args.comparar, encoding="utf-8") as f:
+                anteriores = json.load(f)
+        todos = []
+        for linhas in args.linhas:
+            info, resultados = rodar(linhas, args.backend)
+            imprimir(info, resultados, anteriores)
+            todos.extend(resultados)
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as f:
+                json.dump(todos, f, ensure_ascii=False, indent=1)
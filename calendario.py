@@ -0,0 +1,97 @@
+import calendar
+import threading
+from collections import OrderedDict
+from indice_escala import DIAS_SEMANA
+
+# =========================
+# CALENDÁRIO DO AGENTE (HTML)
+# =========================
+# O HTML de cada mês fica num cache LRU do processo, com chave
+# (agente, ano, mês, versão do agente). A versão do agente é um hash só das
+# linhas dele na escala (IndiceEscala.versao_agente), então publicar uma
+# escala nova só invalida o calendário de quem realmente mudou.
+
+MAX_CALENDARIOS = 1024
+
+
+class CacheLRU:
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, construir):
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return self._itens[chave]
+        valor = construir()
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+        return valor
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+
+_cache = CacheLRU(MAX_CALENDARIOS)
+
+
+def html_mes(por_dia, ano, mes):
+    # Gerar calendário
+    cal = calendar.Calendar(firstweekday=0)  # Segunda-feira = 0
+    semanas = cal.monthdatescalendar(ano, mes)
+
+    partes = ['<div class="calendar-grid">']
+
+    # Cabeçalho
+    for dia in DIAS_SEMANA:
+        partes.append(f'<div class="cal-day-header">{dia}</div>')
+
+    # Dias do calendário
+    for semana in semanas:
+        for dia in semana:
+            other_month_class = " other-month" if dia.month != mes else ""
+
+            # Buscar dados do dia
+            entry = por_dia.get(dia, None)
+
+            if entry:
+                folga_class = " folga" if entry.folga else ""
+
+                # Se for folga, mostrar "FOLGA" em preto
+                if entry.folga:
+                    content = '<div class="cal-day-content"><div class="cal-time-line" style="color: #000000 !important; font-weight: bold !important;">FOLGA</div></div>'
+                else:
+                    # Mostrar horários (sempre mostrar os 3 campos, sem rótulos)
+                    hi_display = entry.inicio if entry.inicio else "—"
+                    hf_display = entry.fim if entry.fim else "—"
+                    pausa_display = entry.pausa if entry.pausa and entry.pausa != "-" else "—"
+
+                    content = f'''<div class="cal-day-content">
+                                <div class="cal-time-line">{hi_display}</div>
+                                <div class="cal-time-line">{hf_display}</div>
+                                <div class="cal-time-line">{pausa_display}</div>
+                            </div>'''
+            else:
+                # Dia sem registro
+                folga_class = ""
+                content = '<div class="cal-day-content"><div class="cal-time-line">—</div></div>'
+
+            partes.append(f'''<div class="cal-day-cell{other_month_class}{folga_class}">
+                        <div class="cal-day-number">{dia.day}</div>
+                        {content}
+                    </div>''')
+
+    partes.append('</div>')
+    return "".join(partes)
+
+
+def calendario_agente(indice, nome, ano, mes):
+    chave = (indice.chave_agente(nome), ano, mes, indice.versao_agente(nome))
+    return _cache.obter(chave, lambda: html_mes(indice.turnos(nome), ano, mes))
+
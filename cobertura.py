@@ -0,0 +1,294 @@
+from collections import namedtuple
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import dados
+from indice_escala import IndiceEscala, _trabalha, normalizar_nome
+
+# =========================
+# COBERTURA DA ESCALA
+# =========================
+# Quantos agentes estão em atendimento em cada intervalo de SLOT_MIN minutos
+# de cada dia, descontando a pausa. A contagem é montada uma vez por versão
+# da escala com um vetor de diferenças (+1 no início de cada trecho, -1 no
+# fim, soma acumulada), sem laço por agente. Para avaliar uma troca ou hora
+# extra só se monta o vetor de diferenças das alterações propostas e se soma
+# à contagem atual dos dias afetados.
+
+SLOT_MIN = 15
+SLOTS_DIA = 24 * 60 // SLOT_MIN
+DURACAO_PAUSA = 20                      # minutos
+MINIMO_AGENTES = 1                      # agentes em atendimento por intervalo
+HORARIO_OPERACAO = ("07:00", "24:00")   # o mínimo só vale dentro desta janela
+
+TROCA_HORARIO = "Troca de horário"
+
+# Uma alteração da escala: um trecho do agente no dia sai (sinal -1) ou
+# entra (sinal +1). A hora extra não tem pausa (pausa_min = -1).
+Alteracao = namedtuple("Alteracao", ["agente", "dia", "inicio_min", "fim_min", "pausa_min", "sinal"])
+
+
+def _hhmm(valor):
+    # "07:30" -> 450; -1 quando não for horário
+    partes = str(valor or "").strip().split(":")
+    if len(partes) != 2 or not all(p.isdigit() for p in partes):
+        return -1
+    return int(partes[0]) * 60 + int(partes[1])
+
+
+def _fmt(minuto):
+    return f"{minuto // 60:02d}:{minuto % 60:02d}"
+
+
+def _janela():
+    ini, fim = (_hhmm(h) for h in HORARIO_OPERACAO)
+    slots = np.arange(SLOTS_DIA)
+    return (slots * SLOT_MIN >= ini) & (slots * SLOT_MIN < fim)
+
+
+def _somar(diff, base, ini, fim, pausa, sinal):
+    # Soma os trechos (ini, fim) menos a pausa no vetor de diferenças, para
+    # arrays inteiros. "base" é o primeiro slot do dia de cada trecho.
+    ok = (ini >= 0) & (fim > ini)
+    base, ini, fim, pausa, sinal = base[ok], ini[ok], fim[ok], pausa[ok], sinal[ok]
+    np.add.at(diff, base + ini // SLOT_MIN, sinal)
+    np.add.at(diff, base + -(-fim // SLOT_MIN), -sinal)
+    # Pausa antes do início: é depois da meia-noite (turno noturno)
+    pausa = np.where((pausa >= 0) & (pausa < ini), pausa + 24 * 60, pausa)
+    p_ini = np.maximum(pausa, ini)
+    p_fim = np.minimum(pausa + DURACAO_PAUSA, fim)
+    tem = (pausa >= 0) & (p_fim > p_ini)
+    np.add.at(diff, base[tem] + p_ini[tem] // SLOT_MIN, -sinal[tem])
+    np.add.at(diff, base[tem] + -(-p_fim[tem] // SLOT_MIN), sinal[tem])
+
+
+class Cobertura:
+    def __init__(self, indice):
+        # contagem[d, s]: agentes em atendimento no slot s do dia inicio + d
+        self.inicio = None
+        self.contagem = np.zeros((0, SLOTS_DIA), dtype=np.int32)
+        trab = indice.h_trabalha[indice.cod_horario]
+        if not trab.any():
+            return
+        dia = indice.dia[trab]
+        primeiro = int(dia.min())
+        self.inicio = date.fromordinal(primeiro)
+        dia = dia - primeiro
+        # +1 dia para os turnos que passam da meia-noite
+        dias = int(dia.max()) + 2
+        diff = np.zeros(dias * SLOTS_DIA + 1, dtype=np.int32)
+        _somar(diff, dia.astype(np.int64) * SLOTS_DIA, indice.inicio_min[trab].astype(np.int64),
+               indice.fim_min[trab].astype(np.int64), indice.pausa_min[trab].astype(np.int64),
+               np.ones(int(trab.sum()), dtype=np.int32))
+        self.contagem = np.cumsum(diff[:-1], dtype=np.int32).reshape(dias, SLOTS_DIA)
+
+    def dias(self, primeiro, quantidade):
+        # Contagem de "quantidade" dias a partir de "primeiro" (zeros fora da escala)
+        saida = np.zeros((quantidade, SLOTS_DIA), dtype=np.int32)
+        if self.inicio is None:
+            return saida
+        de = (primeiro - self.inicio).days
+        a, b = max(de, 0), min(de + quantidade, len(self.contagem))
+        if a < b:
+            saida[a - de:b - de] = self.contagem[a:b]
+        return saida
+
+
+def cobertura():
+    indice = dados.derivado("escala", "indice", IndiceEscala)
+    return dados.derivado("escala", "cobertura", lambda _: Cobertura(indice))
+
+
+# =========================
+# ALTERAÇÕES PROPOSTAS
+# =========================
+def _turno(indice, nome, dia, sinal):
+    t = indice.turno(nome, dia)
+    return Alteracao(normalizar_nome(nome), dia, t.inicio_min, t.fim_min, _hhmm(t.pausa), sinal)
+
+
+def _trabalha_no_dia(indice, nome, dia):
+    t = indice.turno(nome, dia)
+    return t is not None and bool(_trabalha(t)) and t.inicio_min >= 0
+
+
+def _conferir(indice, quem, dia, conflitos, avisos):
+    # True se quem trabalha no dia. Folga ou turno vazio na escala é
+    # conflito; agente ou dia fora da escala cadastrada é só aviso, porque
+    # não há como conferir
+    if not indice.cobre(quem, dia):
+        avisos.append(f"{quem} não tem escala cadastrada em {_br(dia)}; a cobertura não foi conferida")
+        return False
+    if not _trabalha_no_dia(indice, quem, dia):
+        conflitos.append(f"{quem} não trabalha em {_br(dia)}")
+        return False
+    return True
+
+
+def _data(valor):
+    # Datas vêm como AAAA-MM-DD (gravadas pelo app) ou DD/MM/AAAA
+    d = pd.to_datetime(valor, errors="coerce", dayfirst="/" in str(valor))
+    return None if pd.isna(d) else d.date()
+
+
+def _br(dia):
+    return dia.strftime("%d/%m/%Y")
+
+
+def alteracoes_troca(indice, nome, tipo, data_origem, nova_data, pessoa):
+    # (alterações na escala, conflitos, avisos). Troca de folga: o
+    # solicitante folga na Data Origem e a pessoa assume o turno dele; na
+    # Nova Data o solicitante assume o turno da pessoa, que folga. Troca de
+    # horário: os dois trocam de turno na Data Origem. Conflitos impedem a
+    # troca; avisos são turnos que ficariam sem ninguém e entram na conta da
+    # cobertura, ou datas fora da escala cadastrada, que não dá para conferir.
+    origem, nova = _data(data_origem), _data(nova_data)
+    if origem is None or nova is None:
+        return [], ["datas inválidas"], []
+    if not pessoa or normalizar_nome(pessoa) == normalizar_nome(nome):
+        return [], ["informe outra pessoa para a troca"], []
+
+    conflitos, avisos = [], []
+    if str(tipo).strip().lower() == TROCA_HORARIO.lower():
+        ok = [_conferir(indice, quem, origem, conflitos, avisos) for quem in (nome, pessoa)]
+        if not all(ok):
+            return [], conflitos, avisos
+        # Mesmo dia, turnos trocados: cada turno continua coberto
+        a, b = _turno(indice, nome, origem, -1), _turno(indice, pessoa, origem, -1)
+        return [a, b, a._replace(agente=b.agente, sinal=1), b._replace(agente=a.agente, sinal=1)], [], []
+
+    ok = [_conferir(indice, nome, origem, conflitos, avisos), _conferir(indice, pessoa, nova, conflitos, avisos)]
+    if not all(ok):
+        return [], conflitos, avisos
+
+    alteracoes = []
+    turno = _turno(indice, nome, origem, -1)
+    alteracoes.append(turno)
+    if _trabalha_no_dia(indice, pessoa, origem):
+        avisos.append(f"{pessoa} já trabalha em {_br(origem)} e não cobre o turno de {nome}")
+    else:
+        alteracoes.append(turno._replace(agente=normalizar_nome(pessoa), sinal=1))
+    turno = _turno(indice, pessoa, nova, -1)
+    alteracoes.append(turno)
+    if _trabalha_no_dia(indice, nome, nova):
+        avisos.append(f"{nome} já trabalha em {_br(nova)} e não cobre o turno de {pessoa}")
+    else:
+        alteracoes.append(turno._replace(agente=normalizar_nome(nome), sinal=1))
+    return alteracoes, [], avisos
+
+
+def alteracoes_hora_extra(indice, nome, dia, duracao_min):
+    # A hora extra é lançada logo depois do fim do turno do dia. Ela só
+    # acrescenta gente, então nunca é conflito: na folga (sem turno, sem
+    # horário para encaixar) vira aviso e fica fora da conta da cobertura
+    dia = _data(dia)
+    if dia is None:
+        return [], ["data inválida"], []
+    if not indice.cobre(nome, dia):
+        return [], [], [f"{nome} não tem escala cadastrada em {_br(dia)}; a cobertura não foi conferida"]
+    if not _trabalha_no_dia(indice, nome, dia):
+        return [], [], [f"{nome} não tem turno em {_br(dia)}; a hora extra fica fora da conta da cobertura"]
+    t = indice.turno(nome, dia)
+    return [Alteracao(normalizar_nome(nome), dia, t.fim_min, t.fim_min + int(duracao_min), -1, 1)], [], []
+
+
+def duracao_hora_extra(horas):
+    # "01:30" -> 90
+    return max(_hhmm(horas), 0)
+
+
+# =========================
+# AVALIAÇÃO
+# =========================
+Avaliacao = namedtuple("Avaliacao", ["conflitos", "avisos", "faltas", "minimo", "maximo"])
+# faltas: [(dia, "HH:MM", "HH:MM", agentes)] trechos que ficariam abaixo do
+# mínimo por causa das alterações; minimo/maximo: agentes nos intervalos
+# que recebem alguém (None se ninguém entra)
+
+
+def avaliar(alteracoes, conflitos=(), avisos=(), minimo=MINIMO_AGENTES, base=None):
+    conflitos, avisos = dict.fromkeys(conflitos), dict.fromkeys(avisos)
+    if not alteracoes:
+        return Avaliacao(list(conflitos), list(avisos), [], None, None)
+    # Solicitações repetidas no mesmo lote não tiram o mesmo turno duas vezes
+    alteracoes = list(dict.fromkeys(alteracoes))
+    base = base or cobertura()
+    primeiro = min(a.dia for a in alteracoes)
+    # +1 dia para turnos noturnos
+    quantidade = (max(a.dia for a in alteracoes) - primeiro).days + 2
+
+    diff = np.zeros(quantidade * SLOTS_DIA + 1, dtype=np.int32)
+    dia = np.array([(a.dia - primeiro).days for a in alteracoes])
+    _somar(diff, dia * SLOTS_DIA,
+           np.array([a.inicio_min for a in alteracoes]), np.array([a.fim_min for a in alteracoes]),
+           np.array([a.pausa_min for a in alteracoes]), np.array([a.sinal for a in alteracoes], dtype=np.int32))
+    delta = np.cumsum(diff[:-1]).reshape(quantidade, SLOTS_DIA)
+    novo = base.dias(primeiro, quantidade) + delta
+
+    # Abaixo do mínimo dentro da janela de operação, e só onde a alteração
+    # tirou alguém (o que já estava descoberto não é culpa da troca)
+    ruim = (delta < 0) & (novo < minimo) & _janela()
+    faltas = []
+    for d, slots in _trechos(ruim):
+        for ini, fim in slots:
+            faltas.append((primeiro + timedelta(days=int(d)), _fmt(ini * SLOT_MIN), _fmt(fim * SLOT_MIN),
+                           int(novo[d, ini:fim].min())))
+
+    entra = delta > 0
+    menor = int(novo[entra].min()) if entra.any() else None
+    maior = int(novo[entra].max()) if entra.any() else None
+    return Avaliacao(list(conflitos), list(avisos), faltas, menor, maior)
+
+
+def _trechos(mascara):
+    # Para cada linha (dia), os intervalos [ini, fim) contíguos marcados
+    borda = np.diff(np.pad(mascara.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+    for d in np.nonzero(mascara.any(axis=1))[0]:
+        inicios = np.nonzero(borda[d] == 1)[0]
+        fins = np.nonzero(borda[d] == -1)[0]
+        yield d, list(zip(inicios, fins))
+
+
+def avaliar_troca(nome, tipo, data_origem, nova_data, pessoa, indice=None):
+    indice = indice or dados.derivado("escala", "indice", IndiceEscala)
+    return avaliar(*alteracoes_troca(indice, nome, tipo, data_origem, nova_data, pessoa))
+
+
+def avaliar_hora_extra(nome, dia, duracao_min, indice=None):
+    indice = indice or dados.derivado("escala", "indice", IndiceEscala)
+    return avaliar(*alteracoes_hora_extra(indice, nome, dia, duracao_min))
+
+
+def avaliar_lote(tabela, df):
+    # Avalia as solicitações do lote juntas (duas trocas podem passar
+    # sozinhas e descobrir o mesmo intervalo juntas). Devolve a avaliação do
+    # lote e um resumo por linha.
+    indice = dados.derivado("escala", "indice", IndiceEscala)
+    todas, conflitos, avisos, resumo = [], [], [], {}
+    for ident, linha in df.iterrows():
+        if tabela == "trocas":
+            alt, conf, av = alteracoes_troca(indice, linha.get("Nome"), linha.get("Tipo"), linha.get("Data Origem"),
+                                         linha.get("Nova Data"), linha.get("PessoaTroca"))
+        else:
+            alt, conf, av = alteracoes_hora_extra(indice, linha.get("Nome"), linha.get("Dia"),
+                                              duracao_hora_extra(linha.get("Horas")))
+        todas.extend(alt)
+        conflitos.extend(f"{linha.get('Nome')}: {c}" for c in conf)
+        avisos.extend(av)
+        resumo[ident] = resumir(avaliar(alt, conf, av))
+    return avaliar(todas, conflitos, avisos), resumo
+
+
+def resumir(avaliacao):
+    # Texto curto para tabelas e avisos
+    if avaliacao.conflitos:
+        return "; ".join(avaliacao.conflitos)
+    if avaliacao.faltas:
+        d, ini, fim, n = avaliacao.faltas[0]
+        extra = f" (+{len(avaliacao.faltas) - 1})" if len(avaliacao.faltas) > 1 else ""
+        return f"abaixo do mínimo em {_br(d)} {ini}–{fim}: {n} agente(s){extra}"
+    if avaliacao.avisos:
+        return "; ".join(avaliacao.avisos)
+    if avaliacao.minimo is not None:
+        return f"OK · {avaliacao.minimo}–{avaliacao.maximo} agentes no intervalo"
+    return "OK"
@@ -0,0 +1,188 @@
+import threading
+import pandas as pd
+import armazenamento
+
+# =========================
+# CAMADA DE DADOS COMPARTILHADA
+# =========================
+# Este módulo é importado uma única vez por processo do Streamlit, então o
+# que fica guardado aqui é compartilhado por todas as sessões e sobrevive aos
+# reruns. Cada tabela é relida do backend (armazenamento.py) só quando a sua
+# versão muda; nos demais reruns a sessão recebe uma visão do DataFrame já
+# carregado.
+
+# Com copy-on-write a visão entregue à sessão compartilha memória com o cache,
+# e qualquer escrita nela (ex.: hora_extra.loc[...] = ...) gera uma cópia
+# local em vez de alterar o que as outras sessões enxergam.
+try:
+    pd.set_option("mode.copy_on_write", True)
+except Exception:
+    pass
+
+# Tabelas guardadas com colunas categóricas: poucos valores distintos
+# repetidos em muitas linhas (nomes, datas, horários da escala) viram
+# códigos inteiros, e a cópia do processo fica bem menor
+CATEGORICAS = {"escala"}
+
+_trava_global = threading.Lock()
+_tabelas = {}
+
+
+class _Tabela:
+    def __init__(self):
+        # Reentrante: um derivado pode depender de outro da mesma tabela
+        self.trava = threading.RLock()
+        self.assinatura = None
+        self.df = None
+        self.derivados = {}
+
+
+def assinatura(tabela):
+    # Versão da tabela no backend ativo (mtime/tamanho do CSV e do diário,
+    # ou o contador de versões do SQLite)
+    return armazenamento.backend().assinatura(tabela)
+
+
+def _tabela(tabela):
+    with _trava_global:
+        t = _tabelas.get(tabela)
+        if t is None:
+            t = _tabelas[tabela] = _Tabela()
+        return t
+
+
+def _atualizar(tabela, t):
+    # Chamado com t.trava adquirida
+    atual = assinatura(tabela)
+    if t.df is None or t.assinatura != atual:
+        t.df = _compactar(tabela, armazenamento.backend().ler(tabela))
+        t.assinatura = atual
+        t.derivados = {}
+    return t
+
+
+def _categorica(coluna):
+    coluna = coluna.astype("category")
+    # Vazios viram "" (como no fillna("") que o resto do código já faz)
+    if coluna.isna().any():
+        if "" not in coluna.cat.categories:
+            coluna = coluna.cat.add_categories("")
+        coluna = coluna.fillna("")
+    return coluna
+
+
+def _compactar(tabela, df):
+    if tabela not in CATEGORICAS or df.empty:
+        return df
+    return df.apply(_categorica)
+
+
+def garantir_tabelas():
+    armazenamento.backend().garantir()
+
+
+def usar_backend(novo):
+    armazenamento.configurar(novo)
+    invalidar()
+
+
+def carregar(tabela):
+    t = _tabela(tabela)
+    with t.trava:
+        _atualizar(tabela, t)
+        return t.df.copy(deep=False)
+
+
+def versao(tabela):
+    t = _tabela(tabela)
+    with t.trava:
+        return _atualizar(tabela, t).assinatura
+
+
+def derivado(tabela, chave, construir):
+    # Estruturas calculadas a partir da tabela (índices, agregados...) ficam
+    # presas à versão da tabela e são descartadas junto com ela.
+    t = _tabela(tabela)
+    with t.trava:
+        _atualizar(tabela, t)
+        if chave not in t.derivados:
+            t.derivados[chave] = construir(t.df)
+        return t.derivados[chave]
+
+
+def consultar(tabela, **filtros):
+    # Filtro por igualdade (sem diferenciar maiúsculas). No SQLite vira uma
+    # consulta indexada; nos CSVs filtra a tabela já em memória.
+    b = armazenamento.backend()
+    if b.indexado:
+        return b.consultar(tabela, filtros)
+    return armazenamento.filtrar(carregar(tabela), filtros)
+
+
+def invalidar(tabela=None):
+    with _trava_global:
+        alvos = list(_tabelas.values()) if tabela is None else [_tabelas.get(tabela)]
+    for t in alvos:
+        if t is None:
+            continue
+        with t.trava:
+            t.df = None
+            t.assinatura = None
+            t.derivados = {}
+
+
+def anexar(tabela, registros):
+    armazenamento.backend().anexar(tabela, registros)
+    invalidar(tabela)
+
+
+def geracao(tabela):
+    # Ler antes de carregar a tabela: ids lidos depois continuam válidos
+    # enquanto a geração não mudar (ver armazenamento.remover)
+    return armazenamento.backend().geracao(tabela)
+
+
+def atualizar(tabela, ids, campos, geracao_ids=None):
+    gravou = armazenamento.backend().atualizar(tabela, ids, campos, geracao_ids)
+    invalidar(tabela)
+    return gravou
+
+
+def remover(tabela, ids, geracao_ids=None):
+    removeu = armazenamento.backend().remover(tabela, ids, geracao_ids)
+    invalidar(tabela)
+    return removeu
+
+
+def consolidar(tabela):
+    armazenamento.backend().consolidar(tabela)
+    invalidar(tabela)
+
+
+def aplicar(operacoes):
+    # Lote de escritas: uma transação no SQLite, um append por tabela no CSV
+    armazenamento.backend().aplicar(operacoes)
+    for tabela in {op[1] for op in operacoes}:
+        invalidar(tabela)
+
+
+def aplicar_com_delta(tabela, operacoes, deltas, versao_esperada=None):
+    # Como aplicar(), mas os derivados listados em "deltas" ({chave: função
+    # que recebe o derivado antigo e devolve o novo}) são atualizados a
+    # partir da versão anterior em vez de reconstruídos do zero. Só vale se
+    # o cache estava em dia antes da escrita; senão cai na invalidação.
+    # Com versao_esperada (a versão em que os ids das operações foram
+    # lidos), não grava nada se a tabela mudou desde então; devolve se gravou.
+    t = _tabela(tabela)
+    with t.trava:
+        atual = assinatura(tabela)
+        if versao_esperada is not None and atual != versao_esperada:
+            return False
+        em_dia = t.df is not None and t.assinatura == atual
+        antigos = t.derivados
+        armazenamento.backend().aplicar(operacoes)
+        t.df = None
+        _atualizar(tabela, t)
+        if em_dia:
+            t.derivados = {k: fn(antigos[k]) for k, fn in deltas.items() if k in antigos}
+        return True
@@ -0,0 +1,250 @@
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+import dados
+from calendario import CacheLRU
+from cobertura import DURACAO_PAUSA
+from indice_escala import IndiceEscala, _trabalha, colunas_mes, normalizar_nome
+
+try:
+    import openpyxl
+except ImportError:  # Excel é opcional
+    openpyxl = None
+
+# =========================
+# EXPORTAÇÃO DA ESCALA
+# =========================
+# Calendário pessoal em iCalendar (.ics) e escala da equipe em CSV/XLSX.
+# Cada arquivo gerado fica em cache pela versão da escala: o .ics do agente
+# num LRU do processo, com a mesma chave do calendário HTML (agente, ano,
+# mês, versão do agente); os da equipe em disco, em PASTA_EXPORTACOES, com
+# a versão da tabela no nome do arquivo, para servir também os outros
+# processos. Depois de publicar uma escala, o primeiro download de cada
+# arquivo gera e os seguintes só leem.
+#
+# Os arquivos da equipe são escritos em blocos (CSV) ou linha a linha no
+# modo write_only do openpyxl (XLSX), direto no disco, sem montar o arquivo
+# inteiro na memória. O download em si não é em blocos: o st.download_button
+# guarda o conteúdo inteiro na memória do servidor, então o que se evita é
+# só montar o arquivo de novo a cada download.
+
+PASTA_EXPORTACOES = os.environ.get("ESCALA_EXPORTACOES", os.path.join(tempfile.gettempdir(), "wfm_atlas_exportacoes"))
+MAX_ARQUIVOS = 200          # arquivos da equipe mantidos em disco
+MAX_ICAL = 1024             # .ics pessoais mantidos em memória
+TAMANHO_BLOCO = 20_000      # linhas por bloco no CSV
+
+_ical = CacheLRU(MAX_ICAL)
+_trava = threading.Lock()
+
+
+def _indice():
+    return dados.derivado("escala", "indice", IndiceEscala)
+
+
+def _dias_do_mes(ano, mes):
+    primeiro = date(ano, mes, 1)
+    proximo = date(ano + (mes == 12), mes % 12 + 1, 1)
+    return primeiro.toordinal(), proximo.toordinal()
+
+
+# =========================
+# ICALENDAR DO AGENTE
+# =========================
+def _texto_ical(valor):
+    return str(valor).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _dobrar(linha):
+    # Linhas de no máximo 75 bytes; a continuação começa com espaço (RFC 5545)
+    partes, atual = [], ""
+    for c in linha:
+        if len((atual + c).encode("utf-8")) > 75:
+            partes.append(atual)
+            atual = " "
+        atual += c
+    return "\r\n".join(partes + [atual])
+
+
+def _quando(dia, minuto):
+    # Hora local "flutuante" (sem fuso), como o restante do app
+    return (datetime(dia.year, dia.month, dia.day) + timedelta(minutes=int(minuto))).strftime("%Y%m%dT%H%M%S")
+
+
+def _trechos(turno):
+    # (início, fim) em minutos do dia, sem a pausa
+    ini, fim = turno.inicio_min, turno.fim_min
+    pausa = -1
+    partes = turno.pausa.split(":") if turno.pausa else []
+    if len(partes) == 2 and all(p.isdigit() for p in partes):
+        pausa = int(partes[0]) * 60 + int(partes[1])
+        if pausa < ini:
+            pausa += 24 * 60
+    if ini < pausa < fim:
+        return [(ini, pausa), (min(pausa + DURACAO_PAUSA, fim), fim)]
+    return [(ini, fim)]
+
+
+def eventos_agente(turnos, ano, mes, nome):
+    # Linhas VEVENT do mês a partir de {data -> Turno}: um evento por trecho
+    # de trabalho (o turno dividido na pausa) e um de dia inteiro na folga
+    carimbo = datetime.now().strftime("%Y%m%dT%H%M%S")
+    uid = normalizar_nome(nome).replace(" ", ".")
+    for dia in sorted(d for d in turnos if d.year == ano and d.month == mes):
+        t = turnos[dia]
+        if t.folga:
+            yield from [
+                "BEGIN:VEVENT", f"UID:{dia:%Y%m%d}-folga-{uid}@wfm-atlas", f"DTSTAMP:{carimbo}",
+                f"DTSTART;VALUE=DATE:{dia:%Y%m%d}", f"DTEND;VALUE=DATE:{dia + timedelta(days=1):%Y%m%d}",
+                "SUMMARY:FOLGA", "TRANSP:TRANSPARENT", "END:VEVENT",
+            ]
+            continue
+        if not _trabalha(t) or t.inicio_min < 0 or t.fim_min <= t.inicio_min:
+            continue
+        descricao = _texto_ical(f"Turno {t.horario}" + (f" · pausa {t.pausa}" if t.pausa and t.pausa != "-" else ""))
+        for n, (ini, fim) in enumerate(_trechos(t)):
+            yield from [
+                "BEGIN:VEVENT", f"UID:{dia:%Y%m%d}-{n}-{uid}@wfm-atlas", f"DTSTAMP:{carimbo}",
+                f"DTSTART:{_quando(dia, ini)}", f"DTEND:{_quando(dia, fim)}",
+                "SUMMARY:Turno", f"DESCRIPTION:{descricao}", "END:VEVENT",
+            ]
+
+
+def ical_agente(nome, ano, mes, indice=None):
+    # Bytes do .ics do agente no mês, do cache quando a escala dele não mudou
+    indice = indice or _indice()
+    chave = (indice.chave_agente(nome), ano, mes, indice.versao_agente(nome))
+
+    def gerar():
+        linhas = [
+            "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//WFM Atlas//Escala//PT-BR", "CALSCALE:GREGORIAN",
+            f"X-WR-CALNAME:{_texto_ical(f'Escala {nome} {mes:02d}/{ano}')}",
+            *eventos_agente(indice.turnos(nome), ano, mes, nome),
+            "END:VCALENDAR",
+        ]
+        return ("\r\n".join(_dobrar(l) for l in linhas) + "\r\n").encode("utf-8")
+
+    return _ical.obter(chave, gerar)
+
+
+# =========================
+# ESCALA DA EQUIPE
+# =========================
+def blocos_mes(indice, ano, mes, tamanho=TAMANHO_BLOCO):
+    # A escala do mês (Nome, Data, Horário, Pausa), por agente e dia, em
+    # blocos de "tamanho" linhas: o mesmo formato do Importar Escala
+    de, ate = _dias_do_mes(ano, mes)
+    linhas = np.nonzero((indice.dia >= de) & (indice.dia < ate))[0]
+    datas = {d: date.fromordinal(d).strftime("%d/%m/%Y") for d in range(de, ate)}
+    for i in range(0, len(linhas), tamanho):
+        bloco = linhas[i:i + tamanho]
+        yield pd.DataFrame({
+            "Nome": indice.exibicao[indice.agente[bloco]],
+            "Data": [datas[d] for d in indice.dia[bloco].tolist()],
+            "Horário": indice.horarios[indice.cod_horario[bloco]],
+            "Pausa": indice.pausas[indice.cod_pausa[bloco]],
+        })
+
+
+def _escrever_csv(path, indice, ano, mes):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        primeiro = True
+        for bloco in blocos_mes(indice, ano, mes):
+            bloco.to_csv(f, index=False, header=primeiro)
+            primeiro = False
+        if primeiro:
+            f.write("Nome,Data,Horário,Pausa\n")
+
+
+def _escrever_xlsx(path, indice, ano, mes):
+    # Grade agentes x dias, como na tela da equipe, uma linha por agente
+    livro = openpyxl.Workbook(write_only=True)
+    aba = livro.create_sheet(f"{mes:02d}-{ano}")
+    aba.append(["Nome"] + colunas_mes(ano, mes))
+    for nome, linha in indice.linhas_grade_mes(ano, mes):
+        aba.append([nome, *linha])
+    livro.save(path)
+
+
+FORMATOS = {
+    "csv": (_escrever_csv, "text/csv"),
+    "xlsx": (_escrever_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def formatos_equipe():
+    return ["csv", "xlsx"] if openpyxl is not None else ["csv"]
+
+
+def _limpar_pasta():
+    # Mantém só os MAX_ARQUIVOS mais recentes
+    try:
+        arquivos = [os.path.join(PASTA_EXPORTACOES, a) for a in os.listdir(PASTA_EXPORTACOES)]
+    except OSError:
+        return
+    arquivos = sorted((a for a in arquivos if os.path.isfile(a)), key=os.path.getmtime, reverse=True)
+    for a in arquivos[MAX_ARQUIVOS:]:
+        try:
+            os.remove(a)
+        except OSError:
+            pass
+
+
+def arquivo_equipe(ano, mes, formato="csv"):
+    # Caminho do arquivo da equipe no mês, gerado só se ainda não existir
+    # para a versão atual da escala
+    if formato not in formatos_equipe():
+        raise ValueError(f"formato indisponível: {formato}")
+    versao = hashlib.sha1(repr(dados.versao("escala")).encode("utf-8")).hexdigest()[:12]
+    path = os.path.join(PASTA_EXPORTACOES, f"equipe_{ano}-{mes:02d}_{versao}.{formato}")
+    if os.path.exists(path):
+        return path
+    with _trava:
+        if os.path.exists(path):
+            return path
+        os.makedirs(PASTA_EXPORTACOES, exist_ok=True)
+        escrever, _ = FORMATOS[formato]
+        tmp = f"{path}.{os.getpid()}.tmp"
+        escrever(tmp, _indice(), ano, mes)
+        os.replace(tmp, path)
+        _limpar_pasta()
+    return path
+
+
+def conteudo_equipe(ano, mes, formato="csv"):
+    with open(arquivo_equipe(ano, mes, formato), "rb") as f:
+        return f.read()
+
+
+def mime(formato):
+    return FORMATOS[formato][1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta a escala do WFM Atlas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_ag = sub.add_parser("agente", help="calendário .ics de um agente no mês")
+    p_ag.add_argument("nome")
+    p_eq = sub.add_parser("equipe", help="escala da equipe no mês (CSV ou XLSX)")
+    p_eq.add_argument("--formato", choices=formatos_equipe(), default="csv")
+    for p in (p_ag, p_eq):
+        p.add_argument("mes", help="AAAA-MM")
+        p.add_argument("--saida", help="arquivo de saída")
+    args = parser.parse_args()
+
+    dados.garantir_tabelas()
+    ano, mes = (int(x) for x in args.mes.split("-"))
+    if args.comando == "agente":
+        saida = args.saida or f"escala_{normalizar_nome(args.nome).replace(' ', '_')}_{args.mes}.ics"
+        with open(saida, "wb") as f:
+            f.write(ical_agente(args.nome, ano, mes))
+    else:
+        # Cópia do arquivo em cache, sem ler tudo na memória
+        saida = args.saida or f"escala_equipe_{args.mes}.{args.formato}"
+        shutil.copyfile(arquivo_equipe(ano, mes, args.formato), saida)
+    print(saida)
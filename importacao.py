@@ -0,0 +1,187 @@
+import argparse
+import re
+import sys
+import pandas as pd
+import dados
+from indice_escala import coluna_horario, normalizar_nome
+
+# =========================
+# IMPORTAÇÃO DA ESCALA EM LOTE
+# =========================
+# Lê o arquivo de escala em blocos (sem carregar tudo de uma vez), valida
+# cada linha e compara com a escala atual por (Nome, Data). Só as linhas
+# novas ou alteradas são gravadas, e o índice da escala é atualizado a
+# partir da versão anterior em vez de ser reconstruído.
+
+TAMANHO_BLOCO = 50_000
+
+RE_HORARIO = re.compile(r"^([01]\d|2[0-3]):[0-5]\d\s*-\s*([01]\d|2[0-3]):[0-5]\d$")
+RE_PAUSA = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+
+
+class EscalaAlterada(Exception):
+    # A escala mudou entre analisar() e aplicar(): os ids não valem mais
+    pass
+
+
+class ResultadoImportacao:
+    def __init__(self, versao=None):
+        self.versao = versao      # versão da escala em que a diferença foi calculada
+        self.total = 0
+        self.inalteradas = 0
+        self.rejeitadas = []      # dicts com a linha original + Linha e Motivo
+        self.pendentes = {}      # chave -> (Nome, Data, Horário, Pausa, id atual ou None)
+
+    @property
+    def novas(self):
+        return [p for p in self.pendentes.values() if p[4] is None]
+
+    @property
+    def alteradas(self):
+        return [p for p in self.pendentes.values() if p[4] is not None]
+
+    def tabela_rejeitadas(self):
+        return pd.DataFrame(self.rejeitadas, columns=["Linha", "Nome", "Data", "Horário", "Pausa", "Motivo"])
+
+
+def ler_em_blocos(origem, tamanho=TAMANHO_BLOCO):
+    return pd.read_csv(origem, encoding="utf-8-sig", dtype=str, keep_default_na=False, chunksize=tamanho)
+
+
+def validar_bloco(bloco, inicio_linha):
+    # Devolve (válidas, rejeitadas). "Linha" é a linha no arquivo, contando
+    # o cabeçalho como linha 1.
+    bloco = bloco.rename(columns={"HorÃ¡rio": "Horário"})
+    for col in ("Nome", "Data", "Horário", "Pausa"):
+        if col not in bloco.columns:
+            bloco[col] = ""
+    b = pd.DataFrame({
+        "Linha": range(inicio_linha, inicio_linha + len(bloco)),
+        "Nome": bloco["Nome"].astype(str).str.strip(),
+        "Data": bloco["Data"].astype(str).str.strip(),
+        "Horário": bloco["Horário"].astype(str).str.strip(),
+        "Pausa": bloco["Pausa"].astype(str).str.strip(),
+    })
+    datas = pd.to_datetime(b["Data"], format="%d/%m/%Y", errors="coerce")
+    folga = b["Horário"].str.upper().isin(["FOLGA", "OFF"])
+    pausa_ok = b["Pausa"].isin(["", "-"]) | b["Pausa"].str.match(RE_PAUSA)
+
+    motivo = pd.Series("", index=b.index)
+    motivo = motivo.mask(~pausa_ok, "pausa fora do formato HH:MM")
+    motivo = motivo.mask(~(folga | b["Horário"].str.match(RE_HORARIO)), "horário fora do formato HH:MM - HH:MM")
+    motivo = motivo.mask(datas.isna(), "data fora do formato DD/MM/AAAA")
+    motivo = motivo.mask(b["Nome"] == "", "nome vazio")
+
+    ok = motivo == ""
+    validas = b[ok].assign(
+        Data=datas[ok].dt.strftime("%d/%m/%Y"),
+        # Mesma grafia do Escala.csv: "07:00 - 13:00" e "FOLGA"
+        Horário=b.loc[ok, "Horário"].str.replace(r"\s*-\s*", " - ", regex=True).mask(folga[ok], "FOLGA"),
+    )
+    rejeitadas = b[~ok].assign(Motivo=motivo[~ok])
+    return validas, rejeitadas
+
+
+def _chaves(nomes, datas):
+    return nomes.map(normalizar_nome) + "|" + datas.astype(str)
+
+
+def analisar(origem, tamanho=TAMANHO_BLOCO):
+    # Valida o arquivo e calcula a diferença para a escala atual, sem gravar.
+    # A versão é lida antes da tabela: se mudar no meio, aplicar() recusa.
+    versao = dados.versao("escala")
+    atual = dados.carregar("escala")
+    col_h = coluna_horario(atual) or "Horário"
+    if atual.empty:
+        atual_map = pd.DataFrame(columns=["Horário", "Pausa", "id"])
+    else:
+        datas_atual = pd.to_datetime(atual["Data"], format="%d/%m/%Y", errors="coerce").dt.strftime("%d/%m/%Y")
+        atual_map = pd.DataFrame({
+            "Horário": atual[col_h].fillna("").astype(str).str.strip(),
+            "Pausa": atual["Pausa"].fillna("").astype(str).str.strip() if "Pausa" in atual.columns else "",
+            "id": atual.index,
+        })
+        atual_map.index = _chaves(atual["Nome"].fillna("").astype(str), datas_atual)
+        atual_map = atual_map[~atual_map.index.duplicated(keep="last")]
+
+    r = ResultadoImportacao(versao)
+    linha = 2
+    for bloco in ler_em_blocos(origem, tamanho):
+        validas, rejeitadas = validar_bloco(bloco, linha)
+        linha += len(bloco)
+        r.total += len(bloco)
+        r.rejeitadas.extend(rejeitadas.to_dict("records"))
+
+        validas = validas.assign(chave=_chaves(validas["Nome"], validas["Data"])).drop_duplicates("chave", keep="last")
+        comp = validas.join(atual_map, on="chave", rsuffix="_atual")
+        igual = comp["id"].notna() & (comp["Horário"] == comp["Horário_atual"]) & (comp["Pausa"] == comp["Pausa_atual"])
+
+        # Uma linha alterada num bloco e devolvida ao valor atual num bloco
+        # seguinte deixa de ser pendente
+        for chave in comp.loc[igual, "chave"]:
+            if r.pendentes.pop(chave, None) is None:
+                r.inalteradas += 1
+        for chave, nome, data, h, p, id_atual in comp.loc[~igual, ["chave", "Nome", "Data", "Horário", "Pausa", "id"]].itertuples(index=False):
+            r.pendentes[chave] = (nome, data, h, p, None if pd.isna(id_atual) else int(id_atual))
+    return r
+
+
+def aplicar(resultado):
+    # Grava só as linhas novas/alteradas e atualiza o índice da escala;
+    # EscalaAlterada se a escala mudou depois de analisar()
+    if not resultado.pendentes:
+        return 0
+    atual = dados.carregar("escala")
+    col_h = coluna_horario(atual) or "Horário"
+
+    operacoes = []
+    # Alterações agrupadas por valor: poucos registros no diário/UPDATEs
+    grupos = {}
+    for nome, data, h, p, id_atual in resultado.alteradas:
+        grupos.setdefault((h, p), []).append(id_atual)
+    for (h, p), ids in grupos.items():
+        operacoes.append(("atualizar", "escala", ids, {col_h: h, "Pausa": p}))
+    novas = [{"Nome": nome, "Data": data, col_h: h, "Pausa": p} for nome, data, h, p, _ in resultado.novas]
+    if novas:
+        operacoes.append(("anexar", "escala", novas))
+    # O Escala.csv também é trocado inteiro por fora do app: o diário é
+    # consolidado já, para não sobrar alteração presa a posições de linha
+    operacoes.append(("consolidar", "escala"))
+
+    linhas = pd.DataFrame(
+        [(nome, data, h, p) for nome, data, h, p, _ in resultado.pendentes.values()],
+        columns=["Nome", "Data", "Horário", "Pausa"],
+    )
+    # Os ids vêm de analisar(): se o Escala.csv foi trocado desde então,
+    # apontam para outras linhas
+    if not dados.aplicar_com_delta("escala", operacoes, {"indice": lambda indice: indice.com_delta(linhas)},
+                                   versao_esperada=resultado.versao):
+        raise EscalaAlterada("a escala mudou depois da validação; valide o arquivo de novo")
+    return len(resultado.pendentes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa um arquivo de escala (Nome, Data, Horário, Pausa)")
+    parser.add_argument("arquivo", help="CSV da escala, com datas em DD/MM/AAAA")
+    parser.add_argument("--simular", action="store_true", help="só valida e mostra a diferença, sem gravar")
+    parser.add_argument("--rejeitadas", help="grava as linhas rejeitadas neste CSV")
+    parser.add_argument("--bloco", type=int, default=TAMANHO_BLOCO, help="linhas lidas por vez")
+    args = parser.parse_args()
+
+    dados.garantir_tabelas()
+    resultado = analisar(args.arquivo, args.bloco)
+    print(f"Linhas lidas: {resultado.total}")
+    print(f"Rejeitadas:   {len(resultado.rejeitadas)}")
+    print(f"Inalteradas:  {resultado.inalteradas}")
+    print(f"Novas:        {len(resultado.novas)}")
+    print(f"Alteradas:    {len(resultado.alteradas)}")
+    for r in resultado.rejeitadas[:20]:
+        print(f"  linha {r['Linha']}: {r['Motivo']} ({r['Nome']}, {r['Data']}, {r['Horário']})")
+    if args.rejeitadas:
+        resultado.tabela_rejeitadas().to_csv(args.rejeitadas, index=False, encoding="utf-8-sig")
+    if not args.simular:
+        try:
+            print(f"Gravadas:     {aplicar(resultado)}")
+        except EscalaAlterada as e:
+            sys.exit(f"Nada gravado: {e}")
+    sys.exit(1 if resultado.rejeitadas else 0)
@@ -0,0 +1,331 @@
+import calendar
+from collections import namedtuple
+from datetime import date
+import numpy as np
+import pandas as pd
+
+# =========================
+# ÍNDICE DA ESCALA
+# =========================
+# Construído uma vez por versão do Escala.csv (ver dados.derivado) e
+# compartilhado, somente leitura, entre as sessões. A escala fica em forma
+# compacta: nomes, horários e pausas viram códigos inteiros para tabelas de
+# valores distintos, a data vira o número do dia (date.toordinal) e início,
+# fim e pausa viram minutos do dia em int16. Só os valores distintos passam
+# pelo tratamento de texto (algumas dezenas de horários, algumas centenas
+# de datas), não cada linha.
+#
+# As linhas ficam ordenadas por (agente, dia), então a escala de um agente
+# é uma fatia contígua, e há uma ordem por dia só com quem trabalha, para
+# a consulta de agentes disponíveis. Os Turno são montados na hora, só para
+# as linhas consultadas.
+
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+Turno = namedtuple("Turno", ["horario", "inicio", "fim", "pausa", "folga", "inicio_min", "fim_min"])
+
+
+def colunas_mes(ano, mes):
+    # "01 Seg", "02 Ter"... para a grade do mês
+    return [f"{d:02d} {DIAS_SEMANA[calendar.weekday(ano, mes, d)]}" for d in range(1, calendar.monthrange(ano, mes)[1] + 1)]
+
+
+def normalizar_nome(nome):
+    return str(nome or "").strip().lower()
+
+
+def coluna_horario(df):
+    # O cabeçalho pode vir com problema de encoding
+    for col in ("Horário", "HorÃ¡rio"):
+        if col in df.columns:
+            return col
+    return None
+
+
+def parse_datas(serie):
+    # Tentar parsear data no formato DD/MM/YYYY
+    try:
+        return pd.to_datetime(serie, format="%d/%m/%Y", errors="coerce").dt.date
+    except:
+        # Fallback para formato padrão
+        return pd.to_datetime(serie, errors="coerce").dt.date
+
+
+def parse_horario(horario):
+    # Separa "07:00 - 13:00" em início e fim, para uma Series inteira
+    tem_hifen = horario.str.contains("-", regex=False)
+    partes = horario.str.split("-", n=1, expand=True).reindex(columns=[0, 1])
+    inicio = partes[0].fillna("").str.strip().where(tem_hifen, "")
+    fim = partes[1].fillna("").str.strip().where(tem_hifen, "")
+    return inicio, fim
+
+
+def minutos(hhmm):
+    # "07:30" -> 450, para uma Series inteira (-1 quando não for horário)
+    partes = hhmm.str.extract(r"^(\d{1,2}):(\d{2})$")
+    total = partes[0].astype(float) * 60 + partes[1].astype(float)
+    return total.fillna(-1).astype(int)
+
+
+def eh_folga(horario):
+    baixo = horario.str.lower()
+    return baixo.str.contains("folga", regex=False) | baixo.str.contains("off", regex=False)
+
+
+def _trabalha(turno):
+    return not turno.folga and turno.horario and turno.horario != "nan"
+
+
+def _coluna(df, col):
+    return df[col] if col and col in df.columns else pd.Series("", index=df.index)
+
+
+def _fatorar(serie):
+    # (código de cada linha, valores distintos já sem espaços nas pontas).
+    # Vazios ficam com o código do "".
+    codigos, unicos = pd.factorize(serie)
+    valores = pd.Series(np.asarray(unicos, dtype=object), dtype=object).astype(str).str.strip()
+    # O código -1 (vazio) aponta para o "" acrescentado no fim
+    finais, distintos = pd.factorize(pd.concat([valores, pd.Series([""], dtype=object)], ignore_index=True))
+    return finais[codigos].astype(np.int32), np.asarray(distintos, dtype=object)
+
+
+def _compactar(df):
+    # Linhas da escala em códigos: {"nomes", "exibicao", "horarios", "pausas"}
+    # com os valores distintos e {"agente", "dia", "horario", "pausa"} por linha
+    partes = {k: np.zeros(0, dtype=object) for k in ("nomes", "exibicao", "horarios", "pausas")}
+    partes.update({k: np.zeros(0, dtype=np.int32) for k in ("agente", "dia", "horario", "pausa")})
+    if df.empty or "Nome" not in df.columns or "Data" not in df.columns:
+        return partes
+
+    cod_exib, exibicao = _fatorar(df["Nome"])
+    cod_nome, nomes = pd.factorize(pd.Series(exibicao, dtype=object).str.lower())
+    agente = cod_nome[cod_exib]
+    # Nome de exibição de cada agente: o último visto
+    exib = np.empty(len(nomes), dtype=object)
+    exib[cod_nome] = exibicao
+
+    cod_data, datas = _fatorar(df["Data"])
+    ordinais = np.array([d.toordinal() if not pd.isna(d) else -1 for d in parse_datas(pd.Series(datas, dtype=object))],
+                        dtype=np.int32)
+    dia = ordinais[cod_data]
+
+    turno, horarios = _fatorar(_coluna(df, coluna_horario(df)))
+    pausa, pausas = _fatorar(_coluna(df, "Pausa"))
+
+    ok = (np.asarray(nomes, dtype=object)[agente] != "") & (dia >= 0)
+    partes.update({
+        "nomes": np.asarray(nomes, dtype=object), "exibicao": exib, "horarios": horarios, "pausas": pausas,
+        "agente": agente[ok].astype(np.int32), "dia": dia[ok], "horario": turno[ok], "pausa": pausa[ok],
+    })
+    return partes
+
+
+def _unir(antigos, novos):
+    # Tabela de valores distintos com os novos no fim + códigos dos novos
+    posicao = {v: i for i, v in enumerate(antigos)}
+    extra = []
+    for v in novos:
+        if v not in posicao:
+            posicao[v] = len(posicao)
+            extra.append(v)
+    tabela = np.concatenate([antigos, np.array(extra, dtype=object)]) if extra else antigos
+    return tabela, np.array([posicao[v] for v in novos], dtype=np.int32)
+
+
+class IndiceEscala:
+    def __init__(self, df):
+        self._montar(_compactar(df))
+
+    def _montar(self, p):
+        # Tabelas de valores distintos
+        self.nomes, self.exibicao = p["nomes"], p["exibicao"]
+        self.horarios, self.pausas = p["horarios"], p["pausas"]
+        self._codigo = {n: i for i, n in enumerate(self.nomes)}
+
+        # Por horário distinto: início/fim em texto e em minutos, folga, trabalha
+        h = pd.Series(self.horarios, dtype=object)
+        inicio, fim = parse_horario(h)
+        ini_min, fim_min = minutos(inicio), minutos(fim)
+        # Turnos que atravessam a meia-noite terminam no dia seguinte
+        fim_min = fim_min.where((fim_min < 0) | (fim_min >= ini_min), fim_min + 24 * 60)
+        folga = eh_folga(h).to_numpy(dtype=bool)
+        self.h_inicio, self.h_fim = inicio.to_numpy(dtype=object), fim.to_numpy(dtype=object)
+        self.h_ini_min, self.h_fim_min = ini_min.to_numpy(dtype=np.int16), fim_min.to_numpy(dtype=np.int16)
+        self.h_folga = folga
+        self.h_trabalha = ~folga & (h != "").to_numpy() & (h != "nan").to_numpy()
+        self.p_min = minutos(pd.Series(self.pausas, dtype=object)).to_numpy(dtype=np.int16)
+
+        # Uma linha por (agente, dia), a última do arquivo, ordenadas por
+        # agente e dia
+        chave = p["agente"].astype(np.int64) << 32 | p["dia"].astype(np.int64)
+        _, ultimas = np.unique(chave[::-1], return_index=True)
+        linhas = len(chave) - 1 - ultimas
+        self.agente = p["agente"][linhas].astype(np.int32)
+        self.dia = p["dia"][linhas].astype(np.int32)
+        self.cod_horario = p["horario"][linhas].astype(np.int16 if len(self.horarios) < 2 ** 15 else np.int32)
+        self.cod_pausa = p["pausa"][linhas].astype(np.int16 if len(self.pausas) < 2 ** 15 else np.int32)
+
+        # Minutos do dia por linha
+        self.inicio_min = self.h_ini_min[self.cod_horario]
+        self.fim_min = self.h_fim_min[self.cod_horario]
+        self.pausa_min = self.p_min[self.cod_pausa]
+
+        # Fatia de cada agente e ordem por dia de quem trabalha
+        self._fatias = np.searchsorted(self.agente, np.arange(len(self.nomes) + 1))
+        trab = np.nonzero(self.h_trabalha[self.cod_horario])[0]
+        self._por_dia = trab[np.argsort(self.dia[trab], kind="stable")]
+        dias_trab = self.dia[self._por_dia]
+        self._dias, self._fatias_dia = np.unique(dias_trab, return_index=True)
+        self._fatias_dia = np.append(self._fatias_dia, len(dias_trab))
+        self.datas = [date.fromordinal(int(d)) for d in self._dias]
+        self._versoes = {}
+        self._do_dia = {}
+
+    def _partes(self):
+        return {
+            "nomes": self.nomes, "exibicao": self.exibicao, "horarios": self.horarios, "pausas": self.pausas,
+            "agente": self.agente, "dia": self.dia,
+            "horario": self.cod_horario.astype(np.int32), "pausa": self.cod_pausa.astype(np.int32),
+        }
+
+    def __len__(self):
+        return len(self.agente)
+
+    def com_delta(self, linhas):
+        # Novo índice com as linhas (Nome, Data, Horário, Pausa) inseridas ou
+        # alteradas. As tabelas de valores distintos são estendidas e as
+        # linhas novas entram no fim, então prevalecem sobre as antigas; o
+        # índice atual não é modificado, já que outras sessões podem estar
+        # lendo dele.
+        novo = IndiceEscala.__new__(IndiceEscala)
+        atual, delta = self._partes(), _compactar(linhas)
+        if not len(delta["agente"]):
+            novo.__dict__.update(self.__dict__)
+            novo._versoes, novo._do_dia = dict(self._versoes), dict(self._do_dia)
+            return novo
+
+        nomes, mapa_nome = _unir(atual["nomes"], delta["nomes"])
+        exibicao = np.concatenate([atual["exibicao"], np.empty(len(nomes) - len(atual["nomes"]), dtype=object)])
+        exibicao[mapa_nome] = delta["exibicao"]
+        horarios, mapa_h = _unir(atual["horarios"], delta["horarios"])
+        pausas, mapa_p = _unir(atual["pausas"], delta["pausas"])
+        novo._montar({
+            "nomes": nomes, "exibicao": exibicao, "horarios": horarios, "pausas": pausas,
+            "agente": np.concatenate([atual["agente"], mapa_nome[delta["agente"]]]),
+            "dia": np.concatenate([atual["dia"], delta["dia"]]),
+            "horario": np.concatenate([atual["horario"], mapa_h[delta["horario"]]]),
+            "pausa": np.concatenate([atual["pausa"], mapa_p[delta["pausa"]]]),
+        })
+        # Só os agentes alterados perdem a versão calculada
+        alterados = set(delta["nomes"][np.unique(delta["agente"])])
+        novo._versoes = {k: v for k, v in self._versoes.items() if k not in alterados}
+        return novo
+
+    # ---- consultas ----
+    def _turno(self, i):
+        t, p = self.cod_horario[i], self.cod_pausa[i]
+        return Turno(self.horarios[t], self.h_inicio[t], self.h_fim[t], self.pausas[p], bool(self.h_folga[t]),
+                     int(self.h_ini_min[t]), int(self.h_fim_min[t]))
+
+    def _fatia(self, nome):
+        a = self._codigo.get(normalizar_nome(nome))
+        if a is None:
+            return 0, 0
+        return self._fatias[a], self._fatias[a + 1]
+
+    def turnos(self, nome):
+        # {data -> Turno} do agente
+        de, ate = self._fatia(nome)
+        return {date.fromordinal(int(self.dia[i])): self._turno(i) for i in range(de, ate)}
+
+    def turno(self, nome, dia):
+        de, ate = self._fatia(nome)
+        d = dia.toordinal()
+        i = de + np.searchsorted(self.dia[de:ate], d)
+        return self._turno(i) if i < ate and self.dia[i] == d else None
+
+    def cobre(self, nome, dia):
+        # Se a escala cadastrada do agente vai até esse dia (entre o primeiro
+        # e o último dia dele); fora disso não há como saber se ele trabalha
+        de, ate = self._fatia(nome)
+        return ate > de and self.dia[de] <= dia.toordinal() <= self.dia[ate - 1]
+
+    def chave_agente(self, nome):
+        return normalizar_nome(nome)
+
+    def versao_agente(self, nome):
+        # Hash só das linhas do agente: muda quando a escala dele muda,
+        # mesmo que o resto do arquivo continue igual
+        chave = normalizar_nome(nome)
+        if chave not in self._versoes:
+            de, ate = self._fatia(chave)
+            self._versoes[chave] = hash((
+                tuple(self.dia[de:ate].tolist()),
+                tuple(self.horarios[self.cod_horario[de:ate]].tolist()),
+                tuple(self.pausas[self.cod_pausa[de:ate]].tolist()),
+            ))
+        return self._versoes[chave]
+
+    def _trabalhando_ordinal(self, d, excluir):
+        # A lista de cada dia consultado fica guardada no índice
+        do_dia = self._do_dia.get(d)
+        if do_dia is None:
+            k = np.searchsorted(self._dias, d)
+            do_dia = []
+            if k < len(self._dias) and self._dias[k] == d:
+                linhas = self._por_dia[self._fatias_dia[k]:self._fatias_dia[k + 1]]
+                do_dia = [(self.exibicao[self.agente[i]], self._turno(i)) for i in linhas]
+            self._do_dia[d] = do_dia
+        excluir = normalizar_nome(excluir)
+        return [(nome, t) for nome, t in do_dia if normalizar_nome(nome) != excluir]
+
+    def trabalhando(self, dia, excluir=None):
+        return self._trabalhando_ordinal(dia.toordinal(), excluir)
+
+    def trabalhando_periodo(self, inicio, fim, hora_inicio=None, hora_fim=None, excluir=None):
+        # Quem trabalha entre as datas inicio e fim (inclusive). Se hora_inicio
+        # e hora_fim (minutos do dia) forem informados, só entram os turnos que
+        # cobrem essa janela inteira, ex.: 07:00–13:00 -> (420, 780).
+        resultado = []
+        de = np.searchsorted(self._dias, inicio.toordinal(), side="left")
+        ate = np.searchsorted(self._dias, fim.toordinal(), side="right")
+        for d in self._dias[de:ate]:
+            dia = date.fromordinal(int(d))
+            for nome, t in self._trabalhando_ordinal(d, excluir):
+                if hora_inicio is not None and not (0 <= t.inicio_min <= hora_inicio):
+                    continue
+                if hora_fim is not None and t.fim_min < hora_fim:
+                    continue
+                resultado.append((dia, nome, t))
+        return resultado
+
+    def celulas(self):
+        # Texto de cada horário distinto na grade da equipe
+        return np.where(self.h_folga, "FOLGA", np.where(self.horarios == "nan", "", self.horarios)).astype(object)
+
+    def grade_mes(self, ano, mes):
+        # Agentes nas linhas, dias do mês nas colunas, preenchida direto a
+        # partir dos códigos (sem laço por agente)
+        total = calendar.monthrange(ano, mes)[1]
+        primeiro = date(ano, mes, 1).toordinal()
+        no_mes = (self.dia >= primeiro) & (self.dia < primeiro + total)
+        agentes, linha = np.unique(self.agente[no_mes], return_inverse=True)
+        grade = np.full((len(agentes), total), "", dtype=object)
+        grade[linha, self.dia[no_mes] - primeiro] = self.celulas()[self.cod_horario[no_mes]]
+        grade = pd.DataFrame(grade, index=pd.Index(self.exibicao[agentes], name="Nome"), columns=colunas_mes(ano, mes))
+        return grade.sort_index()
+
+    def linhas_grade_mes(self, ano, mes):
+        # As mesmas linhas da grade_mes, (nome, células), geradas uma a uma
+        # a partir da fatia de cada agente, sem montar a grade inteira
+        total = calendar.monthrange(ano, mes)[1]
+        primeiro = date(ano, mes, 1).toordinal()
+        celulas = self.celulas()
+        agentes = np.unique(self.agente[(self.dia >= primeiro) & (self.dia < primeiro + total)])
+        for a in sorted(agentes.tolist(), key=lambda a: self.exibicao[a]):
+            de, ate = self._fatias[a], self._fatias[a + 1]
+            de, ate = de + np.searchsorted(self.dia[de:ate], [primeiro, primeiro + total])
+            linha = np.full(total, "", dtype=object)
+            linha[self.dia[de:ate] - primeiro] = celulas[self.cod_horario[de:ate]]
+            yield self.exibicao[a], linha.tolist()
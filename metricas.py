@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+import armazenamento
+
+# =========================
+# MÉTRICAS DE DESEMPENHO (OPCIONAL)
+# =========================
+# Desligado por padrão. Com ESCALA_METRICAS=1 (ou ligado no painel de
+# desempenho), cada rerun do Escala.py vira um registro com o tempo e os
+# blocos de memória alocados em cada etapa (carregar tabelas, login, menu,
+# página...). Os registros ficam num buffer do processo para o painel e são
+# anexados, um por linha, em metricas.jsonl (ESCALA_METRICAS_LOG), de onde
+# saem o p50/p95 por página juntando todos os processos.
+#
+# Os blocos alocados vêm de sys.getallocatedblocks(): é barato, mas é a
+# variação líquida do processo inteiro, então sessões simultâneas se
+# misturam um pouco. Serve para achar a etapa que aloca demais, não para
+# contabilidade exata.
+
+MAX_REGISTROS = 5000
+
+_ativo = os.environ.get("ESCALA_METRICAS", "").strip().lower() not in ("", "0", "false", "nao")
+_registros = deque(maxlen=MAX_REGISTROS)
+_trava = threading.Lock()
+_local = threading.local()
+
+
+def caminho_log():
+    return os.environ.get("ESCALA_METRICAS_LOG", os.path.join(armazenamento.BASE, "metricas.jsonl"))
+
+
+def ativo():
+    return _ativo
+
+
+def ativar(ligado=True):
+    global _ativo
+    _ativo = bool(ligado)
+
+
+class Medicao:
+    # Um rerun: etapas sequenciais marcadas com marcar(); etapa() mede um
+    # trecho dentro delas (ex.: montar o índice) como uma linha à parte
+    def __init__(self):
+        self.pagina = ""
+        self.inicio = time.perf_counter()
+        self.etapas = []
+        self._atual = None
+        self._concluida = False
+
+    def _agora(self):
+        return time.perf_counter(), sys.getallocatedblocks()
+
+    def marcar(self, nome):
+        self._fechar()
+        self._atual = (nome, *self._agora())
+
+    def _fechar(self):
+        if self._atual:
+            nome, t, b = self._atual
+            t2, b2 = self._agora()
+            self.etapas.append({"etapa": nome, "ms": round((t2 - t) * 1000, 3), "blocos": b2 - b})
+            self._atual = None
+
+    @contextmanager
+    def etapa(self, nome):
+        t, b = self._agora()
+        try:
+            yield
+        finally:
+            t2, b2 = self._agora()
+            self.etapas.append({"etapa": f"› {nome}", "ms": round((t2 - t) * 1000, 3), "blocos": b2 - b})
+
+    def concluir(self, pagina=None):
+        # Fecha o rerun; pode ser chamado mais de uma vez (ex.: antes de
+        # st.stop/st.rerun e no fim do script)
+        if self._concluida:
+            return
+        self._concluida = True
+        self._fechar()
+        registrar({
+            "quando": datetime.now().isoformat(timespec="seconds"),
+            "pagina": pagina or self.pagina or "?",
+            "total_ms": round((time.perf_counter() - self.inicio) * 1000, 3),
+            "etapas": self.etapas,
+        })
+
+
+class _Nula:
+    # Usada com as métricas desligadas: tudo vira no-op
+    pagina = ""
+
+    def marcar(self, nome):
+        pass
+
+    @contextmanager
+    def etapa(self, nome):
+        yield
+
+    def concluir(self, pagina=None):
+        pass
+
+
+_NULA = _Nula()
+
+
+def iniciar():
+    # Começa a medição do rerun desta sessão (cada sessão roda na sua thread)
+    _local.medicao = Medicao() if _ativo else _NULA
+    return _local.medicao
+
+
+def atual():
+    return getattr(_local, "medicao", _NULA)
+
+
+def etapa(nome):
+    return atual().etapa(nome)
+
+
+def medir_fragmento(pagina):
+    # Decorador para os st.fragment: quando só o fragmento reexecuta não
+    # há rerun da página, então ele abre a sua própria Medicao (as etapas
+    # de dentro dele vão para ela) e vira um registro próprio. Rodando
+    # junto com a página, as etapas ficam na medição da página
+    def decorar(funcao):
+        def medido(*args, **kwargs):
+            pai = atual()
+            if not _ativo or (isinstance(pai, Medicao) and not pai._concluida):
+                return funcao(*args, **kwargs)
+            _local.medicao = Medicao()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                _local.medicao.concluir(pagina)
+                _local.medicao = pai
+        medido.__name__ = funcao.__name__
+        return medido
+    return decorar
+
+
+def registrar(registro):
+    with _trava:
+        _registros.append(registro)
+        try:
+            with open(caminho_log(), "a", encoding="utf-8") as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+
+def registros():
+    with _trava:
+        return list(_registros)
+
+
+def ler_log(path=None):
+    path = path or caminho_log()
+    if not os.path.exists(path):
+        return []
+    saida = []
+    with open(path, encoding="utf-8") as f:
+        for linha in f:
+            try:
+                saida.append(json.loads(linha))
+            except ValueError:
+                continue
+    return saida
+
+
+def resumo(regs):
+    # p50/p95 por página (linha "total") e por etapa, em ms
+    linhas = []
+    for r in regs:
+        linhas.append((r["pagina"], "total", r["total_ms"], None))
+        for e in r.get("etapas", []):
+            linhas.append((r["pagina"], e["etapa"], e["ms"], e.get("blocos")))
+    if not linhas:
+        return pd.DataFrame(columns=["Página", "Etapa", "Reruns", "p50 ms", "p95 ms", "Máx ms", "Blocos p50"])
+    df = pd.DataFrame(linhas, columns=["Página", "Etapa", "ms", "blocos"])
+    g = df.groupby(["Página", "Etapa"], sort=False)
+    saida = pd.DataFrame({
+        "Reruns": g["ms"].size(),
+        "p50 ms": g["ms"].quantile(0.5),
+        "p95 ms": g["ms"].quantile(0.95),
+        "Máx ms": g["ms"].max(),
+        "Blocos p50": g["blocos"].median(),
+    }).round(2).reset_index()
+    return saida
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resumo das métricas de desempenho do WFM Atlas")
+    parser.add_argument("--log", default=None, help="arquivo de métricas (padrão: metricas.jsonl)")
+    parser.add_argument("--pagina", help="só esta página")
+    args = parser.parse_args()
+
+    regs = ler_log(args.log)
+    if args.pagina:
+        regs = [r for r in regs if r["pagina"] == args.pagina]
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(resumo(regs).to_string(index=False))
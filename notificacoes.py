@@ -0,0 +1,141 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import dados
+
+# =========================
+# CAIXA DE NOTIFICAÇÕES
+# =========================
+# Estado compartilhado pelo processo: contador de não lidas por usuário e a
+# lista de ids das mensagens de cada um. Quando a tabela muda, só as linhas
+# novas são processadas (e as antigas só têm o status comparado, sem laço
+# em Python), então o contador da barra lateral custa uma consulta ao
+# dicionário em cada rerun.
+
+NAO_LIDA = "Nao Lida"
+LIDA = "Lida"
+
+RETENCAO_DIAS = 90          # mensagens lidas mais antigas que isso são apagadas
+INTERVALO_RETENCAO = 24 * 3600
+
+
+def _chave(usuario):
+    return str(usuario or "").strip().lower()
+
+
+class CaixaNotificacoes:
+    def __init__(self):
+        self._trava = threading.RLock()
+        self._ultima_retencao = 0
+        self._zerar()
+
+    def _zerar(self):
+        self._versao = None
+        self._geracao = None
+        self._linhas = 0
+        self._primeiro = None
+        self._ultimo = None
+        self._lidas = np.zeros(0, dtype=bool)
+        self._usuarios = np.zeros(0, dtype=object)
+        self._ids = {}
+        self._nao_lidas = {}
+
+    def _sincronizar(self):
+        versao = dados.versao("notificacoes")
+        if versao == self._versao:
+            return
+        geracao = dados.geracao("notificacoes")
+        df = dados.carregar("notificacoes")
+        if "Usuario" not in df.columns or "Status" not in df.columns:
+            self._zerar()
+            self._versao = versao
+            return
+
+        n = len(df)
+        # Linhas removidas (retenção): recomeça do zero. No CSV a geração
+        # muda; no SQLite o rowid da primeira ou da última linha conhecida
+        # deixa de bater, mesmo que a tabela tenha o mesmo tamanho de antes
+        k = self._linhas
+        if (geracao != self._geracao or n < k
+                or (k and (df.index[0] != self._primeiro or df.index[k - 1] != self._ultimo))):
+            self._zerar()
+
+        k = self._linhas
+        lidas = (df["Status"].fillna("").astype(str).str.strip().str.lower() != NAO_LIDA.lower()).to_numpy()
+
+        # Linhas já conhecidas que mudaram de status (marcadas como lidas)
+        for i in np.nonzero(lidas[:k] != self._lidas)[0]:
+            u = self._usuarios[i]
+            self._nao_lidas[u] = self._nao_lidas.get(u, 0) + (-1 if lidas[i] else 1)
+
+        # Linhas novas
+        novos = df["Usuario"].iloc[k:].fillna("").astype(str).str.strip().str.lower().to_numpy()
+        for u, idx, lida in zip(novos, df.index[k:], lidas[k:]):
+            self._ids.setdefault(u, []).append(idx)
+            if not lida:
+                self._nao_lidas[u] = self._nao_lidas.get(u, 0) + 1
+
+        self._usuarios = np.concatenate([self._usuarios, novos.astype(object)])
+        self._lidas = lidas
+        self._linhas = n
+        self._primeiro = df.index[0] if n else None
+        self._ultimo = df.index[n - 1] if n else None
+        self._geracao = geracao
+        self._versao = versao
+
+    def nao_lidas(self, usuarios):
+        with self._trava:
+            self._sincronizar()
+            return sum(self._nao_lidas.get(_chave(u), 0) for u in usuarios)
+
+    def buscar(self, usuarios, desde=None):
+        # Mensagens dos usuários, mais novas primeiro; com "desde", só as
+        # posteriores a esse instante
+        with self._trava:
+            self._sincronizar()
+            ids = [i for u in usuarios for i in self._ids.get(_chave(u), [])]
+        df = dados.carregar("notificacoes")
+        df = df.loc[df.index.intersection(ids)]
+        quando = pd.to_datetime(df["DataHora"], errors="coerce")
+        if desde is not None:
+            df = df[quando > pd.Timestamp(desde)]
+            quando = quando[df.index]
+        return df.assign(_quando=quando).sort_values("_quando", ascending=False).drop(columns="_quando")
+
+    def marcar_lidas(self, ids, geracao=None):
+        # ids são posições no arquivo: com a geração lida antes de buscar(),
+        # nada é gravado se a retenção reescreveu o arquivo nesse meio tempo
+        ids = list(ids)
+        if not ids:
+            return True
+        return dados.atualizar("notificacoes", ids, {"Status": LIDA}, geracao)
+
+    def aplicar_retencao(self, dias=RETENCAO_DIAS):
+        # Apaga as mensagens lidas mais antigas que "dias". As posições vêm
+        # de uma leitura fora da trava do arquivo: com a geração lida antes,
+        # nada é removido se outro processo aplicou a retenção nesse meio tempo
+        geracao = dados.geracao("notificacoes")
+        df = dados.carregar("notificacoes")
+        if df.empty or "Status" not in df.columns:
+            return 0
+        quando = pd.to_datetime(df["DataHora"], errors="coerce")
+        lidas = df["Status"].fillna("").astype(str).str.strip().str.lower() != NAO_LIDA.lower()
+        antigas = df.index[lidas & (quando < pd.Timestamp.now() - pd.Timedelta(days=dias))]
+        if not len(antigas):
+            return 0
+        with self._trava:
+            removeu = dados.remover("notificacoes", list(antigas), geracao)
+            self._zerar()
+        return len(antigas) if removeu else 0
+
+    def retencao_em_segundo_plano(self):
+        # No máximo uma vez por INTERVALO_RETENCAO em cada processo
+        with self._trava:
+            if time.time() - self._ultima_retencao < INTERVALO_RETENCAO:
+                return
+            self._ultima_retencao = time.time()
+        threading.Thread(target=self.aplicar_retencao, daemon=True).start()
+
+
+caixa = CaixaNotificacoes()
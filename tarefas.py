@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime
+import pandas as pd
+import analitico
+import armazenamento
+import dados
+
+# =========================
+# FILA DE TAREFAS EM SEGUNDO PLANO
+# =========================
+# O que não precisa acontecer antes da resposta ao clique (notificações,
+# registro de auditoria, agregados dos indicadores) vai para uma fila num
+# SQLite local (fila.db, ESCALA_FILA) e é executado por uma thread do
+# processo. A fila é compartilhada pelos processos: cada tarefa é reservada
+# numa transação antes de rodar, e uma reserva que não termina em
+# RESERVA_SEGUNDOS (processo que morreu no meio) volta para a fila.
+#
+# Tarefa com erro é tentada de novo com espera crescente (2, 4, 8... s) até
+# MAX_TENTATIVAS e depois fica como "falhou", visível no painel de
+# desempenho. A entrega é "pelo menos uma vez": um erro depois da escrita
+# pode repetir a escrita, então as tarefas devem tolerar isso.
+
+MAX_TENTATIVAS = 5
+RESERVA_SEGUNDOS = 300
+INTERVALO = 1.0             # espera da thread quando a fila está vazia
+MANTER_CONCLUIDAS = 1000    # tarefas concluídas guardadas para consulta
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+FALHOU = "falhou"
+
+_tarefas = {}
+_local = threading.local()
+_acordar = threading.Event()
+_trava = threading.Lock()
+_thread = None
+
+
+def caminho_fila():
+    return os.environ.get("ESCALA_FILA", os.path.join(armazenamento.BASE, "fila.db"))
+
+
+def tarefa(nome):
+    # Decorador que registra a função que executa as tarefas "nome"; ela
+    # recebe os parâmetros da tarefa (dict JSON) como argumentos nomeados
+    def registrar(funcao):
+        _tarefas[nome] = funcao
+        return funcao
+    return registrar
+
+
+def _conexao():
+    path = caminho_fila()
+    con = getattr(_local, "con", None)
+    if con is None or getattr(_local, "path", None) != path:
+        con = sqlite3.connect(path, timeout=30, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("""CREATE TABLE IF NOT EXISTS tarefas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, tipo TEXT NOT NULL, dados TEXT NOT NULL,
+            estado TEXT NOT NULL, tentativas INTEGER NOT NULL DEFAULT 0, proxima REAL NOT NULL,
+            criada TEXT NOT NULL, erro TEXT)""")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_estado ON tarefas (estado, proxima)")
+        _local.con, _local.path = con, path
+    return con
+
+
+def _json(valor):
+    if isinstance(valor, (pd.Timestamp, datetime)):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    raise TypeError(f"não serializável: {type(valor).__name__}")
+
+
+def enfileirar(tipo, **parametros):
+    # Grava a tarefa e acorda a thread; retorna o id
+    if tipo not in _tarefas:
+        raise ValueError(f"tarefa desconhecida: {tipo}")
+    cur = _conexao().execute(
+        "INSERT INTO tarefas (tipo, dados, estado, proxima, criada) VALUES (?, ?, ?, ?, ?)",
+        (tipo, json.dumps(parametros, ensure_ascii=False, default=_json), PENDENTE, time.time(),
+         datetime.now().isoformat(timespec="seconds")),
+    )
+    iniciar()
+    _acordar.set()
+    return cur.lastrowid
+
+
+def _reservar():
+    # Pega a próxima tarefa vencida (ou com reserva expirada) numa transação
+    con = _conexao()
+    agora = time.time()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        linha = con.execute(
+            "SELECT id, tipo, dados, tentativas FROM tarefas "
+            "WHERE (estado = ? AND proxima <= ?) OR (estado = ? AND proxima <= ?) ORDER BY id LIMIT 1",
+            (PENDENTE, agora, EXECUTANDO, agora),
+        ).fetchone()
+        if linha:
+            con.execute("UPDATE tarefas SET estado = ?, tentativas = tentativas + 1, proxima = ? WHERE id = ?",
+                        (EXECUTANDO, agora + RESERVA_SEGUNDOS, linha[0]))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return linha
+
+
+def _concluir(id_, tentativas, erro=None):
+    con = _conexao()
+    if erro is None:
+        con.execute("UPDATE tarefas SET estado = ?, erro = NULL WHERE id = ?", (CONCLUIDA, id_))
+    elif tentativas >= MAX_TENTATIVAS:
+        con.execute("UPDATE tarefas SET estado = ?, erro = ? WHERE id = ?", (FALHOU, erro, id_))
+    else:
+        con.execute("UPDATE tarefas SET estado = ?, erro = ?, proxima = ? WHERE id = ?",
+                    (PENDENTE, erro, time.time() + 2 ** tentativas, id_))
+
+
+def executar_pendentes(limite=None):
+    # Executa as tarefas vencidas até a fila esvaziar (ou "limite" tarefas);
+    # retorna quantas foram executadas
+    feitas = 0
+    while limite is None or feitas < limite:
+        linha = _reservar()
+        if linha is None:
+            break
+        id_, tipo, parametros, tentativas = linha
+        try:
+            _tarefas[tipo](**json.loads(parametros))
+            erro = None
+        except Exception:
+            erro = traceback.format_exc(limit=3)
+        _concluir(id_, tentativas + 1, erro)
+        feitas += 1
+    if feitas:
+        _limpar()
+    return feitas
+
+
+def _limpar():
+    _conexao().execute(
+        "DELETE FROM tarefas WHERE estado = ? AND id NOT IN "
+        "(SELECT id FROM tarefas WHERE estado = ? ORDER BY id DESC LIMIT ?)",
+        (CONCLUIDA, CONCLUIDA, MANTER_CONCLUIDAS),
+    )
+
+
+def _laco():
+    while True:
+        try:
+            executar_pendentes()
+        except Exception:
+            traceback.print_exc()
+        _acordar.wait(INTERVALO)
+        _acordar.clear()
+
+
+def iniciar():
+    # Uma thread por processo; também pega o que ficou na fila de antes
+    global _thread
+    with _trava:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_laco, name="fila-de-tarefas", daemon=True)
+            _thread.start()
+
+
+def situacao():
+    # Quantidade de tarefas por estado
+    linhas = _conexao().execute("SELECT estado, COUNT(*) FROM tarefas GROUP BY estado").fetchall()
+    return {e: 0 for e in (PENDENTE, EXECUTANDO, CONCLUIDA, FALHOU)} | dict(linhas)
+
+
+def falhas(limite=100):
+    return pd.read_sql_query(
+        "SELECT id, tipo, tentativas, criada, erro FROM tarefas WHERE estado = ? ORDER BY id DESC LIMIT ?",
+        _conexao(), params=(FALHOU, limite),
+    )
+
+
+def reenfileirar_falhas():
+    cur = _conexao().execute("UPDATE tarefas SET estado = ?, tentativas = 0, proxima = ? WHERE estado = ?",
+                             (PENDENTE, time.time(), FALHOU))
+    _acordar.set()
+    return cur.rowcount
+
+
+# =========================
+# TAREFAS
+# =========================
+def caminho_auditoria():
+    return os.environ.get("ESCALA_AUDITORIA", os.path.join(armazenamento.BASE, "auditoria.jsonl"))
+
+
+@tarefa("notificar")
+def _notificar(registros):
+    dados.anexar("notificacoes", registros)
+
+
+@tarefa("auditoria")
+def _auditoria(**registro):
+    # Uma linha JSON por decisão/solicitação
+    with open(caminho_auditoria(), "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+@tarefa("agregados")
+def _agregados():
+    # Deixa os indicadores em dia antes de alguém abrir a página
+    analitico.agregados.atualizar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fila de tarefas em segundo plano do WFM Atlas")
+    parser.add_argument("--processar", action="store_true", help="executa as tarefas pendentes e sai")
+    parser.add_argument("--reenfileirar", action="store_true", help="volta as tarefas que falharam para a fila")
+    args = parser.parse_args()
+
+    if args.reenfileirar:
+        print(f"{reenfileirar_falhas()} tarefas reenfileiradas")
+    if args.processar:
+        print(f"{executar_pendentes()} tarefas executadas")
+    print(situacao())
+    erros = falhas()
+    if not erros.empty:
+        with pd.option_context("display.max_colwidth", 80, "display.width", 200):
+            print(erros.to_string(index=False))